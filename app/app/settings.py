@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'drf_spectacular',
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.db.routing.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -80,16 +82,115 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# DB_POOL_SIZE > 0 returns connections to a per-process pool (core.db.pool)
+# at the end of each request instead of closing them, DB_CONN_MAX_AGE keeps
+# Django's own persistent connection per thread instead
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'core.db.postgresql' if DB_POOL_SIZE > 0
+            else 'django.db.backends.postgresql'
+        ),
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            'MAX_IDLE': int(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            'CHECK_AFTER': int(os.environ.get('DB_POOL_CHECK_AFTER', 5)),
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 5)),
+        },
+    }
+}
+
+# read replicas, comma separated like DB_HOST; core.db.routing sends the
+# reads of safe requests to views with read_replica = True to them unless
+# the client wrote in the last DB_PRIMARY_PIN_SECONDS. Run the test suite
+# without replicas, TestCase transactions aren't visible through mirrors;
+# core.tests.test_routing sets up a replica of its own.
+DB_REPLICA_HOSTS = [
+    host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host
+]
+DATABASE_REPLICAS = []
+for index, host in enumerate(DB_REPLICA_HOSTS):
+    DATABASE_REPLICAS.append(f'replica{index}')
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['core.db.routing.ReplicaRouter']
+DB_PRIMARY_PIN_SECONDS = int(os.environ.get('DB_PRIMARY_PIN_SECONDS', 5))
+DB_PIN_CACHE = os.environ.get('DB_PIN_CACHE', 'default')
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipe': {
+        'BACKEND': os.environ.get(
+            'RECIPE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('RECIPE_CACHE_LOCATION', 'recipe'),
+    },
 }
 
+RECIPE_CACHE_ALIAS = 'recipe'
+RECIPE_CACHE_TIMEOUT = int(os.environ.get('RECIPE_CACHE_TIMEOUT', 300))
+
+RECIPE_FAST_LIST = os.environ.get('RECIPE_FAST_LIST', '0') == '1'
+RECIPE_EXPORT_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 2000)
+)
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_CONTENT_ADDRESSED = (
+    os.environ.get('RECIPE_IMAGE_CONTENT_ADDRESSED', '0') == '1'
+)
+
+# media files are served by recipe.media.MediaView after a permission check;
+# 'nginx' hands them to the proxy with X-Accel-Redirect under the internal
+# location MEDIA_ACCEL_REDIRECT_PREFIX, 'sendfile' uses X-Sendfile and an
+# empty mode streams them from the worker.
+MEDIA_ACCEL_MODE = os.environ.get('MEDIA_ACCEL_MODE', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get(
+    'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/'
+)
+
+# per-process cache of token lookups; other workers may accept a revoked
+# token for up to AUTH_TOKEN_CACHE_TTL seconds, 0 disables the cache
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 4096))
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get('AUTH_TOKEN_CACHE_TTL', 30))
+
+# signed access tokens (user.tokens), ACCESS_TOKEN_KEYS is 'kid:secret'
+# pairs separated by commas; new tokens use ACCESS_TOKEN_KEY_ID and the
+# others still verify until the tokens they signed have expired
+ACCESS_TOKEN_KEYS = dict(
+    item.split(':', 1)
+    for item in os.environ.get('ACCESS_TOKEN_KEYS', f'0:{SECRET_KEY}')
+    .split(',')
+)
+ACCESS_TOKEN_KEY_ID = os.environ.get(
+    'ACCESS_TOKEN_KEY_ID', next(iter(ACCESS_TOKEN_KEYS))
+)
+ACCESS_TOKEN_TTL = int(os.environ.get('ACCESS_TOKEN_TTL', 300))
+# revoked access tokens; with the per-process default other workers accept
+# a revoked token until it expires, up to ACCESS_TOKEN_TTL seconds, so
+# check --deploy requires a cache shared by all workers
+ACCESS_TOKEN_REVOCATION_CACHE = os.environ.get(
+    'ACCESS_TOKEN_REVOCATION_CACHE', 'default'
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -109,6 +210,27 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# the first hasher hashes new passwords, the others still verify old hashes
+# which are rehashed with the first one on the user's next login
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'user.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+if PASSWORD_HASHER == 'scrypt':
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(1))
+
+AUTHENTICATION_BACKENDS = ['user.backends.PooledModelBackend']
+
+# concurrent password hashes per process, and logins that may wait for one
+LOGIN_HASH_WORKERS = int(
+    os.environ.get('LOGIN_HASH_WORKERS', os.cpu_count() or 1)
+)
+LOGIN_HASH_QUEUE = int(
+    os.environ.get('LOGIN_HASH_QUEUE', 4 * LOGIN_HASH_WORKERS)
+)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -144,8 +266,25 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # token buckets of core.throttling: 'N/period' allows bursts of N
+    # refilled evenly over the period
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get('THROTTLE_LOGIN_IP', '30/min'),
+        'login_account': os.environ.get('THROTTLE_LOGIN_ACCOUNT', '10/min'),
+        'signup_ip': os.environ.get('THROTTLE_SIGNUP_IP', '20/hour'),
+        'recipe_write': os.environ.get('THROTTLE_RECIPE_WRITE', '120/min'),
+        'recipe_upload': os.environ.get('THROTTLE_RECIPE_UPLOAD', '20/min'),
+    },
+    # proxies in front of the app that append to X-Forwarded-For; with 0
+    # throttles and replica pins key on REMOTE_ADDR and ignore the header
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
 }
 
+# where throttle buckets live: 'local' keeps them per process, 'cache'
+# shares them through THROTTLE_CACHE_ALIAS, e.g. a file based cache
+THROTTLE_STORE = os.environ.get('THROTTLE_STORE', 'local')
+THROTTLE_CACHE_ALIAS = os.environ.get('THROTTLE_CACHE_ALIAS', 'default')
+
 SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True
 }
\ No newline at end of file
@@ -19,19 +19,22 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, re_path, include
 from django.conf import settings
 
+from core.views import DatabasePoolView
+from recipe.media import MediaView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/schema/', SpectacularAPIView.as_view(), name = 'api-schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='api-schema'), name = 'api=docs'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
-]
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
\ No newline at end of file
+    path('api/health/db-pool/', DatabasePoolView.as_view(), name='db-pool'),
+    re_path(
+        rf'^{settings.MEDIA_URL.lstrip("/")}(?P<name>.+)$',
+        MediaView.as_view(),
+        name='media',
+    ),
+]
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""per-process pool of psycopg2 connections
+
+Django opens a connection per thread and, with CONN_MAX_AGE=0, closes it
+at the end of every request. The core.db.postgresql backend hands its
+connections to a ConnectionPool instead, so the next request of any
+thread reuses an open connection instead of paying for TCP, TLS and
+authentication again.
+
+Idle connections are kept most recently used first, so a quiet process
+lets its extra connections go idle and closes them after MAX_IDLE
+seconds. Every connection is closed after MAX_LIFETIME seconds so server
+side memory is returned now and then. A connection idle for more than
+CHECK_AFTER seconds is pinged before it is handed out, and one that fails
+the ping is thrown away.
+
+Returned connections are rolled back and reset with DISCARD ALL, so
+settings, temporary tables, prepared statements and advisory locks of one
+request don't leak into the next. Connections that fail the reset are
+closed.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2 import Error as DatabaseError
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+DEFAULTS = {
+    'MAX_SIZE': 10,
+    'MAX_LIFETIME': 1800,
+    'MAX_IDLE': 300,
+    'CHECK_AFTER': 5,
+    'TIMEOUT': 5,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """a bounded pool of connections to one database"""
+
+    def __init__(self, database, max_size, max_lifetime, max_idle,
+                 check_after, timeout):
+        self.database = database
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.timeout = timeout
+        self.pid = os.getpid()
+        # (connection, created, returned), most recently returned last
+        self._idle = deque()
+        # connection -> created, for those handed out
+        self._in_use = {}
+        self._condition = threading.Condition()
+        self.counters = dict.fromkeys((
+            'connects', 'reuses', 'waits', 'timeouts', 'expired',
+            'idle_closed', 'check_failed', 'reset_failed', 'discarded',
+        ), 0)
+
+    def _after_fork(self):
+        """forget connections inherited from the parent process"""
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self._idle.clear()
+            self._in_use.clear()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except DatabaseError:
+            pass
+
+    def _forget(self, connection, reason):
+        """free the slot of a connection that won't be pooled, close it"""
+        with self._condition:
+            self._in_use.pop(connection, None)
+            self.counters[reason] += 1
+            self._condition.notify()
+        self._close(connection)
+
+    def _evict_idle(self, now):
+        """take connections nobody wanted for MAX_IDLE seconds off the list"""
+        evicted = []
+        while self._idle and now - self._idle[0][2] > self.max_idle:
+            evicted.append(self._idle.popleft()[0])
+        self.counters['idle_closed'] += len(evicted)
+        return evicted
+
+    def _check(self, connection, created, returned, now):
+        """None if an idle connection can be handed out, else why not"""
+        if now - created > self.max_lifetime:
+            return 'expired'
+        if connection.closed:
+            return 'check_failed'
+        if now - returned > self.check_after:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                if not connection.autocommit:
+                    connection.rollback()
+            except DatabaseError:
+                return 'check_failed'
+        return None
+
+    def _reset(self, connection):
+        """end the transaction and drop session state, False on failure"""
+        try:
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            autocommit = connection.autocommit
+            # DISCARD ALL refuses to run inside a transaction block
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute('DISCARD ALL')
+            connection.autocommit = autocommit
+        except DatabaseError:
+            return False
+        return True
+
+    def acquire(self, connect):
+        """return an idle connection, or a new one made by connect()
+
+        The lock is only held to pick a connection or reserve a slot, the
+        liveness check and connecting happen outside of it.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            idle = placeholder = None
+            timed_out = False
+            with self._condition:
+                self._after_fork()
+                now = time.monotonic()
+                evicted = self._evict_idle(now)
+                if self._idle:
+                    idle = self._idle.pop()
+                    self._in_use[idle[0]] = idle[1]
+                elif len(self._in_use) < self.max_size:
+                    placeholder = object()
+                    self._in_use[placeholder] = now
+                elif now >= deadline:
+                    self.counters['timeouts'] += 1
+                    timed_out = True
+                else:
+                    self.counters['waits'] += 1
+                    self._condition.wait(deadline - now)
+            for connection in evicted:
+                self._close(connection)
+            if placeholder is not None:
+                break
+            if timed_out:
+                raise OperationalError(
+                    f'no free connection to {self.database} after '
+                    f'{self.timeout}s, all {self.max_size} are in use'
+                )
+            if idle is not None:
+                connection, created, returned = idle
+                reason = self._check(connection, created, returned, now)
+                if reason is None:
+                    with self._condition:
+                        self.counters['reuses'] += 1
+                    return connection
+                self._forget(connection, reason)
+        try:
+            connection = connect()
+        except BaseException:
+            with self._condition:
+                self._in_use.pop(placeholder, None)
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._in_use.pop(placeholder, None)
+            self._in_use[connection] = time.monotonic()
+            self.counters['connects'] += 1
+        return connection
+
+    def release(self, connection):
+        """take a connection back, closing it if it is no good any more
+
+        The connection keeps its slot while it is reset outside the lock.
+        """
+        with self._condition:
+            if self.pid != os.getpid():
+                # the parent's connection, leave its socket alone
+                return
+            known = connection in self._in_use
+        if not known:
+            self._forget(connection, 'discarded')
+            return
+        if connection.closed:
+            self._forget(connection, 'discarded')
+            return
+        if not self._reset(connection):
+            self._forget(connection, 'reset_failed')
+            return
+        with self._condition:
+            now = time.monotonic()
+            # drain() may have expired the connection during the reset
+            created = self._in_use.pop(connection, float('-inf'))
+            self._condition.notify()
+            expired = now - created > self.max_lifetime
+            if expired:
+                self.counters['expired'] += 1
+            else:
+                self._idle.append((connection, created, now))
+        if expired:
+            self._close(connection)
+
+    def discard(self, connection):
+        """close a connection instead of returning it"""
+        self._forget(connection, 'discarded')
+
+    def drain(self):
+        """close idle connections, busy ones are closed on release"""
+        with self._condition:
+            idle = [connection for connection, _, _ in self._idle]
+            self._idle.clear()
+            self.counters['discarded'] += len(idle)
+            self._in_use = {
+                connection: float('-inf') for connection in self._in_use
+            }
+        for connection in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'database': self.database,
+                'max_size': self.max_size,
+                'size': len(self._idle) + len(self._in_use),
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                **self.counters,
+            }
+
+
+def get_pool(alias, conn_params, options):
+    """the pool for an alias, its connection parameters and pool options"""
+    key = (
+        alias,
+        repr(sorted(conn_params.items())),
+        repr(sorted(options.items())),
+    )
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = {**DEFAULTS, **options}
+            pool = _pools[key] = ConnectionPool(
+                database=conn_params.get('database') or 'postgres',
+                max_size=options['MAX_SIZE'],
+                max_lifetime=options['MAX_LIFETIME'],
+                max_idle=options['MAX_IDLE'],
+                check_after=options['CHECK_AFTER'],
+                timeout=options['TIMEOUT'],
+            )
+        return pool
+
+
+def drain_pools(database=None):
+    """close the pooled connections to a database, or to all of them"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        if database is None or pool.database == database:
+            pool.drain()
+
+
+def pool_stats():
+    """statistics of every pool of this process, keyed by alias"""
+    with _pools_lock:
+        items = list(_pools.items())
+    stats = {}
+    for (alias, *_), pool in items:
+        stats.setdefault(alias, []).append(pool.stats())
+    return stats
@@ -0,0 +1,39 @@
+"""postgresql backend taking its connections from core.db.pool
+
+Use it as the ENGINE of a database and configure the pool in the
+database's POOL dict, see core.db.pool.DEFAULTS for the keys.
+"""
+from functools import partial
+
+from django.db.backends.postgresql import base
+
+from core.db.pool import get_pool
+from core.db.postgresql.creation import DatabaseCreation
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(
+            self.alias, conn_params, self.settings_dict.get('POOL', {}),
+        )
+        connection = self.pool.acquire(
+            partial(super().get_new_connection, conn_params)
+        )
+        # set by the parent for new connections, reused ones need it too
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level,
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # the wrapper keeps the connection until the block exits
+                self.pool.discard(self.connection)
+            else:
+                self.pool.release(self.connection)
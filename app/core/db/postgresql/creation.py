@@ -0,0 +1,11 @@
+from django.db.backends.postgresql import creation
+
+from core.db.pool import drain_pools
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # pooled connections would keep the database from being dropped
+        drain_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,123 @@
+"""send the reads of safe requests to read replicas
+
+ReplicaRoutingMiddleware lets GET, HEAD and OPTIONS requests to views
+with ``read_replica = True`` read from one of DATABASE_REPLICAS, picked
+once per request. Everything else, and every write, uses the primary.
+
+Replicas lag behind the primary, so a client that wrote, or sent an
+unsafe request that may have written through raw SQL, is pinned to the
+primary for DB_PRIMARY_PIN_SECONDS and reads its own writes. Clients are
+recognised by their ip and their Authorization header or session cookie,
+kept in the DB_PIN_CACHE, which should be shared by all workers. A write
+in the middle of a request also sends the rest of its reads to the
+primary. Other clients of the same user may still read from a replica
+that lags behind, so caches keyed by the user's latest write, like the
+recipe response cache, must not be filled from one.
+"""
+import contextvars
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+
+
+class Routing:
+    """the database choices of one request"""
+
+    def __init__(self, pin_keys):
+        self.pin_keys = pin_keys
+        self.replica = None
+        self.wrote = False
+
+
+def pin_keys(request):
+    """cache keys identifying the client of a request"""
+    keys = ['db-pin:ip:%s' % BaseThrottle().get_ident(request)]
+    credential = (
+        request.META.get('HTTP_AUTHORIZATION') or
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if credential:
+        digest = hashlib.sha256(credential.encode()).hexdigest()[:32]
+        keys.append('db-pin:credential:%s' % digest)
+    return keys
+
+
+def is_pinned(keys):
+    """whether a client wrote within the pin window"""
+    return bool(caches[settings.DB_PIN_CACHE].get_many(keys))
+
+
+def pin(keys):
+    """read from the primary for a while"""
+    caches[settings.DB_PIN_CACHE].set_many(
+        dict.fromkeys(keys, True), timeout=settings.DB_PRIMARY_PIN_SECONDS,
+    )
+
+
+def reading_from_replica():
+    """whether the reads of the current request go to a replica"""
+    routing = _routing.get()
+    return routing is not None and bool(routing.replica) and not routing.wrote
+
+
+class ReplicaRoutingMiddleware:
+    """pick the database the reads of a request go to"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        routing = Routing(pin_keys(request))
+        token = _routing.set(routing)
+        try:
+            return self.get_response(request)
+        finally:
+            _routing.reset(token)
+            if routing.wrote or request.method not in SAFE_METHODS:
+                pin(routing.pin_keys)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        if routing is None or request.method not in SAFE_METHODS:
+            return None
+        view_class = getattr(view_func, 'cls', None)
+        if not getattr(view_class, 'read_replica', False):
+            return None
+        if not is_pinned(routing.pin_keys):
+            routing.replica = random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+
+class ReplicaRouter:
+    """route reads as the middleware decided, writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return _routing.get().replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,175 @@
+"""Django command to delete recipe image files no recipe refers to
+
+The upload directory is walked with os.scandir one directory at a time and
+checked in batches: a single query per batch finds the names still used as
+a recipe image or variant, and the rest are deleted. Memory depends on the
+batch size, not on the number of files.
+
+With --limit only that many files are checked per run, continuing after
+the last checked name on the next run, so a schedule can work through a
+large volume a slice at a time. The smallest names after that one are
+kept in a heap of --limit entries, and directories holding only earlier
+names are not entered.
+"""
+import heapq
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.models import CleanupCheckpoint, Recipe
+from recipe.images import image_storage, parse_variant_name
+
+UPLOAD_DIR = 'uploads/recipe'
+JOB = 'cleanup_recipe_images'
+
+REFERENCED_SQL = """
+SELECT candidate.name
+FROM unnest(%s::text[]) AS candidate (name)
+JOIN {table} recipe ON recipe.image = candidate.name
+UNION
+SELECT candidate.name
+FROM unnest(%s::text[], %s::jsonb[]) AS candidate (name, probe)
+JOIN {table} recipe ON recipe.image_variants @> candidate.probe
+"""
+
+
+def iter_names(root, prefix, after=''):
+    """yield the storage names of the files below a directory
+
+    Only names greater than after are yielded, directories holding none
+    of them are not entered.
+    """
+    stack = [(root, prefix)]
+    while stack:
+        directory, name_prefix = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                name = f'{name_prefix}/{entry.name}'
+                if entry.is_dir(follow_symlinks=False):
+                    subtree = name + '/'
+                    if after > subtree and not after.startswith(subtree):
+                        continue
+                    stack.append((entry.path, name))
+                elif entry.is_file(follow_symlinks=False) and name > after:
+                    yield name
+
+
+def referenced_names(names):
+    """the subset of storage names used by any recipe"""
+    variants = []
+    probes = []
+    for name in names:
+        parsed = parse_variant_name(name)
+        if parsed is not None:
+            variant, fmt = parsed
+            variants.append(name)
+            probes.append(json.dumps({variant: {fmt: name}}))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            REFERENCED_SQL.format(table=Recipe._meta.db_table),
+            [names, variants, probes],
+        )
+        return {name for name, in cursor.fetchall()}
+
+
+class Command(BaseCommand):
+    help = 'Delete recipe image files that no recipe refers to.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=24 * 60 * 60,
+            help='seconds since a file was last written before it may be '
+                 'deleted, so uploads in progress are kept',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='check at most this many files, continuing after the last '
+                 'checked file on the next run',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='list orphans without deleting them',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError('--limit must be positive')
+        storage = image_storage()
+
+        checkpoint = None
+        position = ''
+        if options['limit']:
+            checkpoint, _ = CleanupCheckpoint.objects.get_or_create(job=JOB)
+            position = checkpoint.position
+        names = iter_names(storage.path(UPLOAD_DIR), UPLOAD_DIR, position)
+        if options['limit']:
+            names = iter(heapq.nsmallest(options['limit'], names))
+
+        cutoff = time.time() - options['min_age']
+        checked = deleted = size = 0
+        last = ''
+        while True:
+            batch = list(islice(names, options['batch_size']))
+            if not batch:
+                break
+            checked += len(batch)
+            last = batch[-1]
+            count, freed = self.delete_orphans(storage, batch, cutoff, options)
+            deleted += count
+            size += freed
+
+        if checkpoint is not None and not options['dry_run']:
+            complete = checked < options['limit']
+            checkpoint.position = '' if complete else last
+            checkpoint.save(update_fields=['position', 'updated_at'])
+
+        verb = 'would delete' if options['dry_run'] else 'deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'checked {checked} files, {verb} {deleted} orphans '
+            f'({size} bytes)'
+        ))
+
+    def delete_orphans(self, storage, batch, cutoff, options):
+        """delete the unreferenced files of a batch older than the cutoff"""
+        stats = {}
+        for name in batch:
+            try:
+                stats[name] = os.stat(storage.path(name))
+            except FileNotFoundError:
+                continue
+        old = [name for name, stat in stats.items() if stat.st_mtime < cutoff]
+        if not old:
+            return 0, 0
+        referenced = referenced_names(old)
+        count = size = 0
+        for name in old:
+            if name in referenced:
+                continue
+            path = storage.path(name)
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                try:
+                    if os.stat(path).st_mtime >= cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            count += 1
+            size += stats[name].st_size
+        return count, size
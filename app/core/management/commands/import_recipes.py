@@ -0,0 +1,329 @@
+"""Django command to bulk import recipes with postgres COPY
+
+Records are read in batches, copied into temporary staging tables and
+merged into the recipe, tag, ingredient and through tables with a few set
+based statements. Each batch commits together with its checkpoint, so an
+interrupted import resumes after the last committed batch.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import ImportCheckpoint, Recipe, Tag
+from recipe.cache import invalidate_user
+
+RELATIONS = ('tags', 'ingredients')
+RECIPE_COLUMNS = ['title', 'description', 'time_minitues', 'price', 'link']
+OPTIONAL_COLUMNS = ('description', 'link')
+
+STAGING_SQL = """
+CREATE TEMPORARY TABLE import_recipe (
+    line bigint PRIMARY KEY,
+    id bigint NOT NULL
+        DEFAULT nextval(pg_get_serial_sequence('core_recipe', 'id')::regclass),
+    user_id bigint NOT NULL,
+    title text NOT NULL,
+    description text NOT NULL,
+    time_minitues integer NOT NULL,
+    price numeric(5, 2) NOT NULL,
+    link text NOT NULL
+);
+CREATE TEMPORARY TABLE import_link (
+    line bigint NOT NULL,
+    relation text NOT NULL,
+    name text NOT NULL
+);
+"""
+
+# inserted in (user, name) order like recipe.serializers.resolve_names, so
+# imports and api writes lock the unique index entries in the same order
+ATTR_MERGE_SQL = """
+INSERT INTO {table} (user_id, name)
+SELECT DISTINCT recipe.user_id, link.name
+FROM import_link link JOIN import_recipe recipe USING (line)
+WHERE link.relation = %s
+ORDER BY recipe.user_id, link.name
+ON CONFLICT (user_id, name) DO NOTHING
+"""
+
+RECIPE_MERGE_SQL = """
+INSERT INTO core_recipe (
+    id, user_id, title, description, time_minitues, price, link, image,
+    image_variants
+)
+SELECT id, user_id, title, description, time_minitues, price, link, '',
+    '{}'
+FROM import_recipe
+"""
+
+LINK_MERGE_SQL = """
+INSERT INTO {through} (recipe_id, {column})
+SELECT DISTINCT recipe.id, item.id
+FROM import_link link
+JOIN import_recipe recipe USING (line)
+JOIN {table} item
+    ON item.user_id = recipe.user_id AND item.name = link.name
+WHERE link.relation = %s
+ON CONFLICT DO NOTHING
+"""
+
+DROP_STAGING_SQL = 'DROP TABLE import_recipe, import_link'
+
+
+def file_digest(path):
+    """sha256 of the file contents, used as the default job name"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_records(path, file_format):
+    """yield csv records as dicts and ndjson records as undecoded lines"""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if file_format == 'csv':
+            yield from csv.DictReader(handle)
+            return
+        for line in handle:
+            if line.strip():
+                yield line
+
+
+def parse_names(value):
+    """names from a list of strings or {'name': ...} or a ; joined string"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(';')
+    names = []
+    for item in value:
+        name = item.get('name') if isinstance(item, dict) else item
+        if not isinstance(name, str):
+            raise ValidationError(f'invalid name {name!r}')
+        name = name.strip()
+        if name:
+            names.append(name)
+    return names
+
+
+def clean_record(record):
+    """validate one record and return its columns and relation names"""
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except ValueError as error:
+            raise ValidationError(f'invalid json: {error}')
+    if not isinstance(record, dict):
+        raise ValidationError('expected an object')
+    values = {}
+    for column in RECIPE_COLUMNS:
+        field = Recipe._meta.get_field(column)
+        value = record.get(column)
+        if value in (None, '') and column in OPTIONAL_COLUMNS:
+            values[column] = ''
+            continue
+        try:
+            values[column] = field.clean(value, None)
+        except ValidationError as error:
+            raise ValidationError(f'{column}: {"; ".join(error.messages)}')
+    name_length = Tag._meta.get_field('name').max_length
+    relations = {}
+    for relation in RELATIONS:
+        names = parse_names(record.get(relation))
+        if any(len(name) > name_length for name in names):
+            raise ValidationError(f'{relation}: name too long')
+        relations[relation] = list(dict.fromkeys(names))
+    owner = record.get('user')
+    if owner is not None and not isinstance(owner, str):
+        raise ValidationError('user: expected an email')
+    return owner, values, relations
+
+
+def _copy_rows(cursor, table, columns, rows):
+    """COPY rows into a staging table through an in-memory csv buffer"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    names = ', '.join(columns)
+    cursor.copy_expert(
+        f'COPY {table} ({names}) FROM STDIN '
+        f'WITH (FORMAT csv, FORCE_NOT_NULL ({names}))',
+        buffer,
+    )
+
+
+def merge_batch(recipe_rows, link_rows):
+    """copy a cleaned batch into staging tables and merge it"""
+    with connection.cursor() as cursor:
+        cursor.execute(STAGING_SQL)
+        _copy_rows(
+            cursor,
+            'import_recipe',
+            ['line', 'user_id', *RECIPE_COLUMNS],
+            recipe_rows,
+        )
+        _copy_rows(cursor, 'import_link', ['line', 'relation', 'name'],
+                   link_rows)
+        cursor.execute('ANALYZE import_recipe, import_link')
+        for relation in RELATIONS:
+            field = Recipe._meta.get_field(relation)
+            table = field.related_model._meta.db_table
+            cursor.execute(ATTR_MERGE_SQL.format(table=table), [relation])
+        cursor.execute(RECIPE_MERGE_SQL)
+        for relation in RELATIONS:
+            field = Recipe._meta.get_field(relation)
+            through = field.remote_field.through._meta
+            cursor.execute(LINK_MERGE_SQL.format(
+                through=through.db_table,
+                column=through.get_field(
+                    field.m2m_reverse_field_name()
+                ).column,
+                table=field.related_model._meta.db_table,
+            ), [relation])
+        cursor.execute(DROP_STAGING_SQL)
+
+
+class Command(BaseCommand):
+    help = 'Import recipes from ndjson or csv files using COPY.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+')
+        parser.add_argument(
+            '--user',
+            help='email of the owner for records without a "user" field',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['ndjson', 'csv'],
+            help='file format, guessed from the extension by default',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--job',
+            help='checkpoint name, the file checksum by default',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='ignore any checkpoint and import from the start',
+        )
+        parser.add_argument(
+            '--skip-invalid',
+            action='store_true',
+            help='report and skip invalid records instead of stopping',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['job'] and len(options['files']) > 1:
+            raise CommandError('--job needs a single file')
+        for path in options['files']:
+            if not os.path.exists(path):
+                raise CommandError(f'{path} does not exist')
+            self.import_file(path, options)
+
+    def import_file(self, path, options):
+        """import one file, resuming from its checkpoint"""
+        file_format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'ndjson'
+        )
+        job = options['job'] or (
+            f'{os.path.basename(path)[:180]}:{file_digest(path)}'
+        )
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(job=job)
+        if options['restart']:
+            checkpoint.records = 0
+            checkpoint.completed = False
+            checkpoint.save()
+        if checkpoint.completed:
+            self.stdout.write(f'{path}: already imported as job {job}')
+            return
+        if checkpoint.records:
+            self.stdout.write(
+                f'{path}: resuming after {checkpoint.records} records'
+            )
+
+        records = read_records(path, file_format)
+        position = checkpoint.records
+        records = enumerate(islice(records, position, None), position + 1)
+        started = time.monotonic()
+        imported = skipped = 0
+        while True:
+            batch = list(islice(records, options['batch_size']))
+            if not batch:
+                break
+            count, invalid = self.import_batch(batch, checkpoint, options)
+            imported += count
+            skipped += invalid
+            rate = imported / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{path}: {checkpoint.records} records processed, '
+                f'{imported} imported ({rate:.0f}/s)'
+            )
+
+        checkpoint.completed = True
+        checkpoint.save(update_fields=['completed', 'updated_at'])
+        summary = f'{path}: imported {imported} recipes'
+        if skipped:
+            summary += f', skipped {skipped} invalid records'
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def reject(self, line, error, options):
+        """stop on an invalid record, or report it with --skip-invalid"""
+        message = f'record {line}: {"; ".join(error.messages)}'
+        if not options['skip_invalid']:
+            raise CommandError(message)
+        self.stderr.write(message)
+
+    def import_batch(self, batch, checkpoint, options):
+        """merge a batch and advance the checkpoint in one transaction"""
+        user_model = get_user_model()
+        cleaned = []
+        for line, record in batch:
+            try:
+                owner, values, relations = clean_record(record)
+            except ValidationError as error:
+                self.reject(line, error, options)
+                continue
+            email = user_model.objects.normalize_email(
+                owner or options['user'] or ''
+            )
+            cleaned.append((line, email, values, relations))
+        users = dict(user_model.objects.filter(
+            email__in={email for _, email, _, _ in cleaned},
+        ).values_list('email', 'id'))
+
+        recipe_rows = []
+        link_rows = []
+        for line, email, values, relations in cleaned:
+            if email not in users:
+                error = ValidationError(f'unknown user {email!r}')
+                self.reject(line, error, options)
+                continue
+            recipe_rows.append(
+                [line, users[email], *(values[c] for c in RECIPE_COLUMNS)]
+            )
+            link_rows.extend(
+                [line, relation, name]
+                for relation, names in relations.items() for name in names
+            )
+
+        with transaction.atomic():
+            if recipe_rows:
+                merge_batch(recipe_rows, link_rows)
+            checkpoint.records = batch[-1][0]
+            checkpoint.save(update_fields=['records', 'updated_at'])
+        for user_id in {row[1] for row in recipe_rows}:
+            invalidate_user(user_id)
+        return len(recipe_rows), len(batch) - len(recipe_rows)
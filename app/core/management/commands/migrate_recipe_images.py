@@ -0,0 +1,146 @@
+"""Django command to move existing recipe images to content addressed names
+
+Every image stored under a random name is hashed and copied to its sha256
+name, together with its rendered variants. Recipes are repointed in one
+update per batch, and the old files are deleted once nothing refers to
+them. Rows that change while the command runs are left for the next run.
+"""
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.models import Recipe
+from core.storage import CONTENT_ROOT, content_digest, content_image_path
+from recipe.cache import invalidate_user
+from recipe.images import FORMATS, image_storage, variant_name
+
+
+class Command(BaseCommand):
+    help = 'Move recipe images to content addressed storage names.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='report what would be moved without changing anything',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        legacy = Recipe.objects.exclude(image__isnull=True).exclude(
+            image='',
+        ).exclude(
+            image__startswith=f'{CONTENT_ROOT}/',
+        ).order_by('image').values_list('image', flat=True).distinct()
+
+        storage = image_storage()
+        last = ''
+        moved = missing = 0
+        while True:
+            names = list(
+                legacy.filter(image__gt=last)[:options['batch_size']]
+            )
+            if not names:
+                break
+            last = names[-1]
+            targets = {}
+            for name in names:
+                if not storage.exists(name):
+                    self.stderr.write(f'{name}: file is missing, skipped')
+                    missing += 1
+                    continue
+                with storage.open(name, 'rb') as handle:
+                    target = content_image_path(
+                        content_digest(handle),
+                        os.path.splitext(name)[1],
+                    )
+                    if not options['dry_run']:
+                        storage.save(target, handle)
+                targets[name] = target
+            if options['dry_run']:
+                moved += len(targets)
+                continue
+            moved += self.repoint(storage, targets)
+            self.stdout.write(f'{moved} images moved')
+
+        prefix = 'would move' if options['dry_run'] else 'moved'
+        summary = f'{prefix} {moved} images'
+        if missing:
+            summary += f', {missing} missing files skipped'
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def move_variants(self, storage, target, variants):
+        """copy rendered variants to names derived from the new image
+
+        Variants whose file is gone are dropped, the others are kept.
+        """
+        moved = {}
+        for variant, names in variants.items():
+            for fmt, name in names.items():
+                if fmt not in FORMATS or not storage.exists(name):
+                    self.stderr.write(f'{name}: variant is missing, dropped')
+                    continue
+                new_name = variant_name(target, variant, FORMATS[fmt][0])
+                with storage.open(name, 'rb') as handle:
+                    storage.save(new_name, handle)
+                moved.setdefault(variant, {})[fmt] = new_name
+        return moved
+
+    def update_rows(self, targets, updates):
+        """repoint the rows in one statement, return the affected users
+
+        Only rows whose image and variants are still as they were read are
+        updated, the others changed meanwhile and are left alone.
+        """
+        if not updates:
+            return set()
+        values, params = [], []
+        for recipe_id, _, name, variants, new_variants in updates:
+            values.append('(%s, %s, %s::jsonb, %s, %s::jsonb)')
+            params += [recipe_id, name, json.dumps(variants),
+                       targets[name], json.dumps(new_variants)]
+        sql = (
+            f'UPDATE {connection.ops.quote_name(Recipe._meta.db_table)} '
+            'AS recipe SET image = moved.new_image, '
+            'image_variants = moved.new_variants '
+            f'FROM (VALUES {", ".join(values)}) AS moved '
+            '(id, image, variants, new_image, new_variants) '
+            'WHERE recipe.id = moved.id AND recipe.image = moved.image '
+            'AND recipe.image_variants = moved.variants '
+            'RETURNING recipe.user_id'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {user_id for user_id, in cursor.fetchall()}
+
+    def repoint(self, storage, targets):
+        """point recipes at the new names and drop unreferenced old files"""
+        rows = Recipe.objects.filter(image__in=targets).values_list(
+            'id', 'user_id', 'image', 'image_variants',
+        )
+        updates = []
+        for recipe_id, user_id, name, variants in rows:
+            new_variants = self.move_variants(
+                storage, targets[name], variants,
+            )
+            updates.append((recipe_id, user_id, name, variants, new_variants))
+
+        for user_id in self.update_rows(targets, updates):
+            invalidate_user(user_id)
+
+        referenced = set(Recipe.objects.filter(
+            image__in=targets,
+        ).values_list('image', flat=True))
+        # per recipe, rows sharing an image may list different variants
+        for _, _, name, variants, _ in updates:
+            if name in referenced:
+                continue
+            storage.delete(name)
+            for names in variants.values():
+                for variant in names.values():
+                    storage.delete(variant)
+        return len(targets) - len(referenced)
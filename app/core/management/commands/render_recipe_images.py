@@ -0,0 +1,76 @@
+"""Django command to render the missing variants of recipe images
+
+Variants are rendered on an in-process pool once an upload commits, so a
+restart or a crash can lose jobs that were still queued. This renders
+every recipe that has an image but no variants, in batches by id. Images
+written less than --min-age seconds ago are skipped, their job may still
+be on its way.
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+from recipe.images import generate_variants, image_storage
+
+
+class Command(BaseCommand):
+    help = 'Render variants of recipe images that have none.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=10 * 60,
+            help='seconds since an image was written before it is '
+                 'rendered here, so queued jobs are not duplicated',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='list the recipes without rendering anything',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        pending = Recipe.objects.exclude(image__isnull=True).exclude(
+            image='',
+        ).filter(image_variants={}).order_by('id').values_list(
+            'id', 'user_id', 'image',
+        )
+        storage = image_storage()
+        cutoff = time.time() - options['min_age']
+        last = 0
+        rendered = failed = missing = 0
+        while True:
+            rows = list(pending.filter(id__gt=last)[:options['batch_size']])
+            if not rows:
+                break
+            last = rows[-1][0]
+            for recipe_id, user_id, name in rows:
+                try:
+                    modified = os.path.getmtime(storage.path(name))
+                except FileNotFoundError:
+                    self.stderr.write(f'{name}: file is missing, skipped')
+                    missing += 1
+                    continue
+                if modified >= cutoff:
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(f'recipe {recipe_id}: {name}')
+                    rendered += 1
+                elif generate_variants(recipe_id, user_id, name):
+                    rendered += 1
+                else:
+                    failed += 1
+
+        prefix = 'would render' if options['dry_run'] else 'rendered'
+        summary = f'{prefix} variants of {rendered} recipes'
+        if failed:
+            summary += f', {failed} failed'
+        if missing:
+            summary += f', {missing} missing files skipped'
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,67 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+# Keep the oldest row per (user, name), move recipe links from the
+# duplicates onto it and delete the duplicates. Pending foreign key checks
+# are flushed so the unique constraints can be added in the same
+# transaction.
+DEDUPE_SQL = """
+CREATE TEMPORARY TABLE {table}_dupes AS
+SELECT id, keep_id FROM (
+    SELECT id, min(id) OVER (PARTITION BY user_id, name) AS keep_id
+    FROM {table}
+) ranked
+WHERE id <> keep_id;
+
+INSERT INTO {through} (recipe_id, {column})
+SELECT link.recipe_id, dupes.keep_id
+FROM {through} link
+JOIN {table}_dupes dupes ON dupes.id = link.{column}
+ON CONFLICT DO NOTHING;
+
+DELETE FROM {through} link
+USING {table}_dupes dupes WHERE link.{column} = dupes.id;
+
+DELETE FROM {table} item
+USING {table}_dupes dupes WHERE item.id = dupes.id;
+
+DROP TABLE {table}_dupes;
+
+SET CONSTRAINTS ALL IMMEDIATE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_attr_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            DEDUPE_SQL.format(
+                table='core_ingredient',
+                through='core_recipe_ingredients',
+                column='ingredient_id',
+            ),
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            DEDUPE_SQL.format(
+                table='core_tag',
+                through='core_recipe_tags',
+                column='tag_id',
+            ),
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_ingredient_user_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_tag_user_name_uniq'),
+        ),
+    ]
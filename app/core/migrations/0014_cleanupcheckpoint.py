@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:05
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_image_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CleanupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=255, unique=True)),
+                ('position', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['image_variants'], name='core_recipe_variants_idx', opclasses=['jsonb_path_ops'], fastupdate=False),
+        ),
+    ]
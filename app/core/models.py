@@ -2,6 +2,8 @@
 Database models.
 """
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -11,12 +13,16 @@ from django.conf import settings
 import uuid
 import os
 
+from core.storage import RecipeImageStorage, content_upload_path
+
 # Create your models here.
 
 def recipe_image_file_path(intance, filename):
     """generte file path for new recip eimage"""
 
     ext = os.path.splitext(filename)[1]
+    if settings.RECIPE_IMAGE_CONTENT_ADDRESSED:
+        return content_upload_path(ext)
     filename = f'{uuid.uuid4()}{ext}'
 
     return os.path.join('uploads', 'recipe', filename)
@@ -67,7 +73,33 @@ class Recipe(models.Model):
     link=models.CharField(max_length=220, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=RecipeImageStorage(),
+    )
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'id'],
+                name='core_recipe_user_id_idx',
+            ),
+            GinIndex(
+                fields=['user', 'search_vector'],
+                name='core_recipe_search_idx',
+                fastupdate=False,
+            ),
+            models.Index(fields=['image'], name='core_recipe_image_idx'),
+            GinIndex(
+                fields=['image_variants'],
+                name='core_recipe_variants_idx',
+                opclasses=['jsonb_path_ops'],
+                fastupdate=False,
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -80,6 +112,22 @@ class Tag(models.Model):
         on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            GinIndex(
+                fields=['user', 'name'],
+                name='core_tag_name_trgm_idx',
+                opclasses=['int8_ops', 'gin_trgm_ops'],
+                fastupdate=False,
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='core_tag_user_name_uniq',
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -88,5 +136,42 @@ class Ingredient(models.Model):
     name = models.CharField(max_length=200)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            GinIndex(
+                fields=['user', 'name'],
+                name='core_ingredient_name_trgm_idx',
+                opclasses=['int8_ops', 'gin_trgm_ops'],
+                fastupdate=False,
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='core_ingredient_user_name_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ImportCheckpoint(models.Model):
+    """progress of a resumable recipe import"""
+    job = models.CharField(max_length=255, unique=True)
+    records = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.job
+
+
+class CleanupCheckpoint(models.Model):
+    """position of an incremental media cleanup"""
+    job = models.CharField(max_length=255, unique=True)
+    position = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.job
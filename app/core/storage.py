@@ -0,0 +1,94 @@
+"""
+Content addressed storage for recipe images.
+
+With RECIPE_IMAGE_CONTENT_ADDRESSED on, uploads are named after the sha256
+of their bytes, so identical photos share one file and a name never points
+at different content. Such names are safe to cache forever.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_ROOT = 'uploads/recipe/sha256'
+CONTENT_NAME = re.compile(
+    rf'^{CONTENT_ROOT}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(_\w+)?(\.\w+)?$'
+)
+
+
+def content_digest(content):
+    """sha256 hex digest of a django file, read in chunks"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def content_image_path(digest, ext):
+    """storage name of an image with the given digest"""
+    return f'{CONTENT_ROOT}/{digest[:2]}/{digest}{ext.lower()}'
+
+
+def content_upload_path(ext):
+    """name for an upload that the storage renames after its digest"""
+    return f'{CONTENT_ROOT}/upload{ext.lower()}'
+
+
+def is_content_addressed(name):
+    """whether a storage name is derived from the file contents"""
+    return bool(name) and CONTENT_NAME.match(name) is not None
+
+
+class RecipeImageStorage(FileSystemStorage):
+    """file system storage that shares content addressed files
+
+    Files saved under CONTENT_ROOT are renamed after the digest of their
+    contents. A content addressed name that exists already holds the same
+    bytes, so saving it again only refreshes its mtime. Concurrent writers
+    of a new name each write a temporary file and atomically rename it into
+    place.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if name.startswith(f'{CONTENT_ROOT}/') and (
+            not is_content_addressed(name)
+        ):
+            name = content_image_path(
+                content_digest(content), os.path.splitext(name)[1],
+            )
+        if is_content_addressed(name) and self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        if is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not is_content_addressed(name):
+            return super()._save(name, content)
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                for chunk in content.chunks():
+                    handle.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
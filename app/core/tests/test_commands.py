@@ -1,13 +1,35 @@
 """
 Test custom Django management commands.
 """
+import hashlib
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
 from unittest.mock import patch
 
+from PIL import Image
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.management.commands.migrate_recipe_images import Command
+from core.models import (
+    CleanupCheckpoint,
+    ImportCheckpoint,
+    Ingredient,
+    Recipe,
+    Tag,
+)
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -31,4 +53,513 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
 
         self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
\ No newline at end of file
+        patched_check.assert_called_with(databases=['default'])
+
+
+class ImportRecipesCommandTests(TestCase):
+    """Test the import_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'import@example.com',
+            'pass1234',
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write(self, name, text):
+        """write a file to the temp dir and return its path"""
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+        return path
+
+    def ndjson(self, records):
+        """write records as ndjson and return the path"""
+        lines = ''.join(json.dumps(record) + '\n' for record in records)
+        return self.write('recipes.ndjson', lines)
+
+    def call(self, *args, **options):
+        """run the command and return its output"""
+        out = StringIO()
+        call_command(
+            'import_recipes', *args, stdout=out, stderr=StringIO(), **options
+        )
+        return out.getvalue()
+
+    def record(self, i, **params):
+        """build one import record"""
+        record = {
+            'title': f'recipe {i}',
+            'time_minitues': 10,
+            'price': '5.50',
+            'description': 'imported',
+            'tags': ['Dinner', f'tag {i}'],
+            'ingredients': [{'name': 'Salt'}],
+        }
+        record.update(params)
+        return record
+
+    def test_import_ndjson(self):
+        """recipes, tags, ingredients and links are created"""
+        existing = Tag.objects.create(user=self.user, name='Dinner')
+        path = self.ndjson([self.record(i) for i in range(3)])
+
+        self.call(path, user=self.user.email)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(
+            [recipe.title for recipe in recipes],
+            ['recipe 0', 'recipe 1', 'recipe 2'],
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+        for recipe in recipes:
+            self.assertIn(existing, recipe.tags.all())
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(recipe.ingredients.get().name, 'Salt')
+            self.assertEqual(recipe.price, Decimal('5.50'))
+
+    def test_import_csv_for_several_users(self):
+        """the user column picks the owner of each record"""
+        other = get_user_model().objects.create_user('o@example.com', 'p')
+        path = self.write('recipes.csv', (
+            'user,title,time_minitues,price,description,tags,ingredients\n'
+            'import@example.com,"Curry, hot",30,9.99,,Dinner;Spicy,Rice\n'
+            'o@example.com,Soup,15,3.00,warm,,\n'
+        ))
+
+        self.call(path)
+
+        curry = Recipe.objects.get(user=self.user)
+        self.assertEqual(curry.title, 'Curry, hot')
+        self.assertEqual(
+            sorted(curry.tags.values_list('name', flat=True)),
+            ['Dinner', 'Spicy'],
+        )
+        soup = Recipe.objects.get(user=other)
+        self.assertEqual(soup.description, 'warm')
+        self.assertFalse(soup.tags.exists())
+
+    def test_import_searchable(self):
+        """imported recipes get a search vector"""
+        path = self.ndjson([self.record(0, title='Saffron rice')])
+
+        self.call(path, user=self.user.email)
+
+        self.assertTrue(Recipe.objects.filter(
+            search_vector='saffron',
+        ).exists())
+
+    def test_invalid_record_stops_import(self):
+        """an invalid record fails with its record number"""
+        path = self.ndjson([self.record(0), self.record(1, price='lots')])
+
+        with self.assertRaisesRegex(CommandError, 'record 2: price'):
+            self.call(path, user=self.user.email, batch_size=5)
+
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_skip_invalid(self):
+        """invalid records and unknown users are skipped when asked"""
+        path = self.write('recipes.ndjson', '\n'.join([
+            json.dumps(self.record(0)),
+            'not json',
+            json.dumps(self.record(2, user='nobody@example.com')),
+            json.dumps(self.record(3)),
+        ]))
+
+        output = self.call(path, user=self.user.email, skip_invalid=True)
+
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertIn('skipped 2 invalid records', output)
+
+    def test_resume_after_failure(self):
+        """committed batches are not imported twice on resume"""
+        records = [self.record(i) for i in range(5)]
+        records[3]['time_minitues'] = 'soon'
+        path = self.ndjson(records)
+
+        with self.assertRaises(CommandError):
+            self.call(path, user=self.user.email, batch_size=2, job='partner')
+        self.assertEqual(Recipe.objects.count(), 2)
+
+        records[3]['time_minitues'] = 20
+        path = self.ndjson(records)
+        output = self.call(
+            path, user=self.user.email, batch_size=2, job='partner',
+        )
+
+        self.assertIn('resuming after 2 records', output)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            [f'recipe {i}' for i in range(5)],
+        )
+        checkpoint = ImportCheckpoint.objects.get(job='partner')
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual(checkpoint.records, 5)
+
+    def test_completed_import_not_repeated(self):
+        """importing the same file twice is a no-op"""
+        path = self.ndjson([self.record(0)])
+        self.call(path, user=self.user.email)
+
+        output = self.call(path, user=self.user.email)
+
+        self.assertIn('already imported', output)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+
+class MigrateRecipeImagesCommandTests(TestCase):
+    """Test the migrate_recipe_images command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'images@example.com',
+            'pass1234',
+        )
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def create_recipe(self, content, **params):
+        """create a recipe with a legacy image name"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='sample recipe',
+            time_minitues=10,
+            price=Decimal('5.50'),
+            **params,
+        )
+        recipe.image.save('photo.jpg', ContentFile(content))
+        return recipe
+
+    def call(self, *args):
+        """run the command and return its output"""
+        out = StringIO()
+        call_command(
+            'migrate_recipe_images', *args, stdout=out, stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def test_duplicates_moved_to_one_file(self):
+        """legacy copies of the same bytes end up as one shared file"""
+        first = self.create_recipe(b'same bytes')
+        second = self.create_recipe(b'same bytes')
+        legacy = [first.image.name, second.image.name]
+
+        out = self.call('--batch-size', '1')
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        digest = hashlib.sha256(b'same bytes').hexdigest()
+        target = f'uploads/recipe/sha256/{digest[:2]}/{digest}.jpg'
+        self.assertEqual(first.image.name, target)
+        self.assertEqual(second.image.name, target)
+        self.assertTrue(self.storage.exists(target))
+        self.assertFalse(any(self.storage.exists(name) for name in legacy))
+        self.assertIn('moved 2 images', out)
+
+    def test_one_update_per_batch(self):
+        """a batch of recipes is repointed with a single statement"""
+        recipes = [self.create_recipe(b'bytes %d' % i) for i in range(3)]
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.call()
+
+        updates = [query for query in ctx.captured_queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        for recipe in recipes:
+            recipe.refresh_from_db()
+            self.assertTrue(recipe.image.name.startswith(
+                'uploads/recipe/sha256/',
+            ))
+
+    def test_changed_rows_left_alone(self):
+        """rows changed while their files are copied keep their image"""
+        recipe = self.create_recipe(b'original')
+        name = recipe.image.name
+        move_variants = Command.move_variants
+
+        def change_row(command, storage, target, variants):
+            Recipe.objects.filter(id=recipe.id).update(
+                image_variants={'thumbnail': {}},
+            )
+            return move_variants(command, storage, target, variants)
+
+        with patch.object(Command, 'move_variants', change_row):
+            out = self.call()
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertIn('moved 0 images', out)
+
+    def test_variants_moved(self):
+        """rendered variants are copied next to the new name"""
+        recipe = self.create_recipe(b'original')
+        variant = self.storage.save('uploads/recipe/x_thumbnail.webp',
+                                    ContentFile(b'thumbnail'))
+        Recipe.objects.filter(id=recipe.id).update(
+            image_variants={'thumbnail': {'webp': variant}},
+        )
+
+        self.call()
+
+        recipe.refresh_from_db()
+        moved = recipe.image_variants['thumbnail']['webp']
+        self.assertEqual(
+            moved, recipe.image.name.replace('.jpg', '_thumbnail.webp'),
+        )
+        with self.storage.open(moved) as handle:
+            self.assertEqual(handle.read(), b'thumbnail')
+        self.assertFalse(self.storage.exists(variant))
+
+    def test_missing_variant_dropped(self):
+        """a missing variant file doesn't cost the variants that exist"""
+        recipe = self.create_recipe(b'original')
+        variant = self.storage.save('uploads/recipe/x_thumbnail.webp',
+                                    ContentFile(b'thumbnail'))
+        Recipe.objects.filter(id=recipe.id).update(image_variants={
+            'thumbnail': {'webp': variant,
+                          'jpeg': 'uploads/recipe/x_thumbnail.jpg'},
+        })
+
+        self.call()
+
+        recipe.refresh_from_db()
+        self.assertEqual(list(recipe.image_variants['thumbnail']), ['webp'])
+        self.assertTrue(self.storage.exists(
+            recipe.image_variants['thumbnail']['webp'],
+        ))
+
+    def test_shared_image_variants_per_recipe(self):
+        """rows sharing an image each keep and clean up their variants"""
+        first = self.create_recipe(b'original')
+        second = self.create_recipe(b'other')
+        self.storage.delete(second.image.name)
+        old = {}
+        for recipe, variant in ((first, 'thumbnail'), (second, 'medium')):
+            name = self.storage.save(f'uploads/recipe/x_{variant}.webp',
+                                     ContentFile(variant.encode()))
+            Recipe.objects.filter(id=recipe.id).update(
+                image=first.image.name,
+                image_variants={variant: {'webp': name}},
+            )
+            old[recipe.id] = name
+
+        self.call()
+
+        for recipe, variant in ((first, 'thumbnail'), (second, 'medium')):
+            recipe.refresh_from_db()
+            moved = recipe.image_variants[variant]['webp']
+            with self.storage.open(moved) as handle:
+                self.assertEqual(handle.read(), variant.encode())
+            self.assertFalse(self.storage.exists(old[recipe.id]))
+
+    def test_dry_run(self):
+        """a dry run reports without touching rows or files"""
+        recipe = self.create_recipe(b'original')
+        name = recipe.image.name
+
+        out = self.call('--dry-run')
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertIn('would move 1 images', out)
+
+    def test_missing_file_skipped(self):
+        """rows whose file is gone are reported and left alone"""
+        recipe = self.create_recipe(b'original')
+        self.storage.delete(recipe.image.name)
+
+        out = self.call()
+
+        self.assertIn('1 missing files skipped', out)
+
+
+class CleanupRecipeImagesCommandTests(TestCase):
+    """Test the cleanup_recipe_images command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'cleanup@example.com',
+            'pass1234',
+        )
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def save(self, name, age=7 * 24 * 60 * 60):
+        """store a file last written age seconds ago"""
+        name = self.storage.save(name, ContentFile(b'file'))
+        written = time.time() - age
+        os.utime(self.storage.path(name), (written, written))
+        return name
+
+    def call(self, *args):
+        """run the command and return its output"""
+        out = StringIO()
+        call_command('cleanup_recipe_images', *args, stdout=out)
+        return out.getvalue()
+
+    def test_orphans_deleted(self):
+        """unreferenced files go, images and variants in use stay"""
+        image = self.save('uploads/recipe/a.jpg')
+        variant = self.save('uploads/recipe/a_thumbnail.webp')
+        orphan = self.save('uploads/recipe/b.jpg')
+        stale_variant = self.save('uploads/recipe/b_thumbnail_x1.webp')
+        shared = self.save('uploads/recipe/sha256/ab/orphan.jpg')
+        Recipe.objects.create(
+            user=self.user,
+            title='sample recipe',
+            time_minitues=10,
+            price=Decimal('5.50'),
+            image=image,
+            image_variants={'thumbnail': {'webp': variant}},
+        )
+
+        out = self.call('--batch-size', '2')
+
+        self.assertTrue(self.storage.exists(image))
+        self.assertTrue(self.storage.exists(variant))
+        for name in (orphan, stale_variant, shared):
+            self.assertFalse(self.storage.exists(name))
+        self.assertIn('checked 5 files, deleted 3 orphans (12 bytes)', out)
+
+    def test_recent_files_kept(self):
+        """files younger than --min-age may belong to uploads in progress"""
+        name = self.save('uploads/recipe/new.jpg', age=60)
+
+        self.call()
+
+        self.assertTrue(self.storage.exists(name))
+
+    def test_dry_run(self):
+        """a dry run lists orphans without deleting them"""
+        name = self.save('uploads/recipe/orphan.jpg')
+
+        out = self.call('--dry-run')
+
+        self.assertTrue(self.storage.exists(name))
+        self.assertIn(name, out)
+        self.assertIn('would delete 1 orphans', out)
+
+    def test_incremental_runs(self):
+        """limited runs continue where the previous run stopped"""
+        names = [self.save(f'uploads/recipe/{i}.jpg') for i in range(5)]
+
+        self.call('--limit', '2')
+        self.assertEqual(
+            [self.storage.exists(name) for name in names],
+            [False, False, True, True, True],
+        )
+        checkpoint = CleanupCheckpoint.objects.get()
+        self.assertEqual(checkpoint.position, names[1])
+
+        self.call('--limit', '2')
+        self.call('--limit', '2')
+
+        self.assertFalse(any(self.storage.exists(name) for name in names))
+        checkpoint.refresh_from_db()
+        self.assertEqual(checkpoint.position, '')
+
+    def test_limited_walk(self):
+        """limited runs go in name order and skip finished directories"""
+        first = self.save('uploads/recipe/a-1.jpg')
+        second = self.save('uploads/recipe/a/1.jpg')
+        third = self.save('uploads/recipe/b/2.jpg')
+        fourth = self.save('uploads/recipe/c.jpg')
+
+        names = [first, second, third, fourth]
+        for i in range(3):
+            self.call('--limit', '1')
+            self.assertEqual(
+                [self.storage.exists(name) for name in names],
+                [False] * (i + 1) + [True] * (3 - i),
+            )
+
+        with patch('os.scandir', wraps=os.scandir) as patched_scandir:
+            self.call('--limit', '1')
+        scanned = [call.args[0] for call in patched_scandir.call_args_list]
+        self.assertFalse(self.storage.exists(fourth))
+        self.assertNotIn(self.storage.path('uploads/recipe/a'), scanned)
+
+
+class RenderRecipeImagesCommandTests(TestCase):
+    """Test the render_recipe_images command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'render@example.com',
+            'pass1234',
+        )
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def create_recipe(self, content, age=60 * 60):
+        """create a recipe whose image was written age seconds ago"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='sample recipe',
+            time_minitues=10,
+            price=Decimal('5.50'),
+        )
+        recipe.image.save('photo.jpg', ContentFile(content))
+        written = time.time() - age
+        os.utime(self.storage.path(recipe.image.name), (written, written))
+        return recipe
+
+    def call(self, *args):
+        """run the command and return its output"""
+        out = StringIO()
+        call_command(
+            'render_recipe_images', *args, stdout=out, stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def jpeg(self):
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200)).save(buffer, format='JPEG')
+        return buffer.getvalue()
+
+    def test_missing_variants_rendered(self):
+        """recipes with an image but no variants are rendered"""
+        recipe = self.create_recipe(self.jpeg())
+
+        out = self.call('--batch-size', '1')
+
+        recipe.refresh_from_db()
+        self.assertIn('thumbnail', recipe.image_variants)
+        self.assertIn('rendered variants of 1 recipes', out)
+
+    def test_recent_images_skipped(self):
+        """images that may still have a queued job are left alone"""
+        recipe = self.create_recipe(self.jpeg(), age=0)
+
+        out = self.call()
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, {})
+        self.assertIn('rendered variants of 0 recipes', out)
+
+    def test_failures_reported(self):
+        """images pillow cannot read are counted as failed"""
+        self.create_recipe(b'not an image')
+
+        with self.assertLogs('recipe.images', level='ERROR'):
+            out = self.call()
+
+        self.assertIn('1 failed', out)
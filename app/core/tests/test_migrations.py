@@ -0,0 +1,72 @@
+"""
+Tests for data migrations.
+"""
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+BEFORE = [('core', '0008_attr_name_trigram_indexes')]
+AFTER = [('core', '0009_attr_user_name_unique')]
+
+
+class DedupeAttrNamesMigrationTests(TransactionTestCase):
+    """0009 merges duplicate tags and ingredients before going unique"""
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(BEFORE)
+        self.apps = executor.loader.project_state(BEFORE).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate_forward(self):
+        """apply the dedupe migration and return the new model states"""
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(AFTER)
+        return executor.loader.project_state(AFTER).apps
+
+    def test_duplicates_merged_and_links_moved(self):
+        """the oldest row survives and keeps every recipe link"""
+        User = self.apps.get_model('core', 'User')
+        Recipe = self.apps.get_model('core', 'Recipe')
+        Tag = self.apps.get_model('core', 'Tag')
+        user = User.objects.create(email='dedupe@example.com')
+        other = User.objects.create(email='other@example.com')
+        keep = Tag.objects.create(user=user, name='Dinner')
+        dupe = Tag.objects.create(user=user, name='Dinner')
+        Tag.objects.create(user=user, name='dinner')
+        other_tag = Tag.objects.create(user=other, name='Dinner')
+        recipes = [
+            Recipe.objects.create(
+                user=user,
+                title=f'recipe {i}',
+                time_minitues=5,
+                price='1.00',
+                description='',
+            )
+            for i in range(3)
+        ]
+        recipes[0].tags.add(keep)
+        recipes[1].tags.add(dupe)
+        recipes[2].tags.add(keep, dupe)
+
+        apps = self.migrate_forward()
+
+        Tag = apps.get_model('core', 'Tag')
+        Recipe = apps.get_model('core', 'Recipe')
+        self.assertFalse(Tag.objects.filter(id=dupe.id).exists())
+        self.assertEqual(
+            sorted(Tag.objects.filter(user_id=user.id).values_list(
+                'name', flat=True,
+            )),
+            ['Dinner', 'dinner'],
+        )
+        self.assertTrue(Tag.objects.filter(id=other_tag.id).exists())
+        for recipe in recipes:
+            tag_ids = list(Recipe.objects.get(id=recipe.id).tags.values_list(
+                'id', flat=True,
+            ))
+            self.assertEqual(tag_ids, [keep.id])
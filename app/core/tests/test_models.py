@@ -1,7 +1,10 @@
 """
 Tests for models.
 """
-from django.test import TestCase
+import hashlib
+import tempfile
+from django.test import TestCase, override_settings
+from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
 from decimal import Decimal
 from core import models
@@ -101,3 +104,21 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, 'example.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+    @override_settings(RECIPE_IMAGE_CONTENT_ADDRESSED=True)
+    def test_recipe_file_name_content_addressed(self):
+        """uploads are named after the sha256 of their bytes"""
+        recipe = models.Recipe()
+        with tempfile.TemporaryDirectory() as media:
+            with override_settings(MEDIA_ROOT=media):
+                recipe.image.save(
+                    'Example.JPG',
+                    ContentFile(b'image bytes'),
+                    save=False,
+                )
+
+        digest = hashlib.sha256(b'image bytes').hexdigest()
+        self.assertEqual(
+            recipe.image.name,
+            f'uploads/recipe/sha256/{digest[:2]}/{digest}.jpg',
+        )
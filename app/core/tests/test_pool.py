@@ -0,0 +1,248 @@
+"""
+Tests for the database connection pool.
+"""
+import threading
+from unittest.mock import patch
+
+import psycopg2
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db.pool import ConnectionPool, drain_pools, pool_stats
+from core.db.postgresql.base import DatabaseWrapper
+
+POOL_URL = reverse('db-pool')
+
+
+class ConnectionPoolTests(TestCase):
+    """Test handing out and taking back connections."""
+
+    def setUp(self):
+        self.pool = ConnectionPool(
+            database='test', max_size=2, max_lifetime=60, max_idle=30,
+            check_after=5, timeout=0,
+        )
+        self.addCleanup(self.pool.drain)
+
+    def connect(self):
+        """open a connection that is closed after the test"""
+        conn = psycopg2.connect(**connection.get_connection_params())
+        self.addCleanup(conn.close)
+        return conn
+
+    def test_reuse(self):
+        """a released connection is handed out again"""
+        first = self.pool.acquire(self.connect)
+        self.pool.release(first)
+
+        second = self.pool.acquire(self.connect)
+
+        self.assertIs(second, first)
+        self.assertEqual(self.pool.stats()['connects'], 1)
+        self.assertEqual(self.pool.stats()['reuses'], 1)
+
+    def test_exhausted(self):
+        """no more than max_size connections are open at once"""
+        self.pool.acquire(self.connect)
+        self.pool.acquire(self.connect)
+
+        with self.assertRaises(psycopg2.OperationalError):
+            self.pool.acquire(self.connect)
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+
+    def test_open_transaction_rolled_back(self):
+        """connections come back without a transaction"""
+        conn = self.pool.acquire(self.connect)
+        with conn.cursor() as cursor:
+            cursor.execute('CREATE TEMP TABLE pooled (id int)')
+
+        self.pool.release(conn)
+
+        self.assertEqual(conn.get_transaction_status(),
+                         psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def test_session_reset(self):
+        """settings and temporary tables don't outlive a checkout"""
+        conn = self.pool.acquire(self.connect)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SET statement_timeout = '1s'")
+            cursor.execute('CREATE TEMP TABLE pooled (id int)')
+        self.pool.release(conn)
+
+        reused = self.pool.acquire(self.connect)
+        with reused.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            timeout = cursor.fetchone()[0]
+            cursor.execute("SELECT to_regclass('pg_temp.pooled')")
+            table = cursor.fetchone()[0]
+
+        self.assertIs(reused, conn)
+        self.assertTrue(reused.autocommit)
+        self.assertNotEqual(timeout, '1s')
+        self.assertIsNone(table)
+
+    def test_failed_reset(self):
+        """a connection that cannot be reset is closed"""
+        conn = self.pool.acquire(self.connect)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_terminate_backend(%s)', [conn.get_backend_pid()]
+            )
+
+        self.pool.release(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(self.pool.stats()['reset_failed'], 1)
+        self.assertEqual(self.pool.stats()['size'], 0)
+
+    def test_reset_outside_lock(self):
+        """a slow reset doesn't hold up threads acquiring connections"""
+        first = self.pool.acquire(self.connect)
+        resetting = threading.Event()
+        proceed = threading.Event()
+        reset = self.pool._reset
+
+        def slow_reset(conn):
+            resetting.set()
+            proceed.wait(5)
+            return reset(conn)
+
+        with patch.object(self.pool, '_reset', slow_reset):
+            thread = threading.Thread(target=self.pool.release, args=[first])
+            thread.start()
+            resetting.wait(5)
+            unlocked = self.pool._condition.acquire(timeout=1)
+            if unlocked:
+                self.pool._condition.release()
+            second = self.pool.acquire(self.connect)
+            proceed.set()
+            thread.join()
+
+        self.assertTrue(unlocked)
+        self.assertIsNot(second, first)
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+    @patch('core.db.pool.time.monotonic')
+    def test_max_lifetime(self, patched_monotonic):
+        """old connections are closed instead of reused"""
+        patched_monotonic.return_value = 1000.0
+        first = self.pool.acquire(self.connect)
+        patched_monotonic.return_value = 1040.0
+        self.pool.release(first)
+
+        patched_monotonic.return_value = 1061.0
+        second = self.pool.acquire(self.connect)
+
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats()['expired'], 1)
+
+    @patch('core.db.pool.time.monotonic')
+    def test_idle_eviction(self, patched_monotonic):
+        """connections idle for too long are closed"""
+        patched_monotonic.return_value = 1000.0
+        first = self.pool.acquire(self.connect)
+        second = self.pool.acquire(self.connect)
+        self.pool.release(first)
+        patched_monotonic.return_value = 1020.0
+        self.pool.release(second)
+
+        patched_monotonic.return_value = 1040.0
+        reused = self.pool.acquire(self.connect)
+
+        self.assertIs(reused, second)
+        self.assertTrue(first.closed)
+        self.assertEqual(self.pool.stats()['idle_closed'], 1)
+
+    @patch('core.db.pool.time.monotonic')
+    def test_liveness_check(self, patched_monotonic):
+        """a connection the server dropped is replaced"""
+        patched_monotonic.return_value = 1000.0
+        first = self.pool.acquire(self.connect)
+        self.pool.release(first)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_terminate_backend(%s)', [first.get_backend_pid()]
+            )
+
+        patched_monotonic.return_value = 1010.0
+        second = self.pool.acquire(self.connect)
+
+        self.assertIsNot(second, first)
+        self.assertEqual(self.pool.stats()['check_failed'], 1)
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+    def test_drain(self):
+        """draining closes idle connections now and busy ones on release"""
+        idle = self.pool.acquire(self.connect)
+        busy = self.pool.acquire(self.connect)
+        self.pool.release(idle)
+
+        self.pool.drain()
+        self.pool.release(busy)
+
+        self.assertTrue(idle.closed)
+        self.assertTrue(busy.closed)
+        self.assertEqual(self.pool.stats()['size'], 0)
+
+
+class PooledBackendTests(TestCase):
+    """Test the pooled database backend."""
+
+    def test_close_returns_connection(self):
+        """closing a database connection keeps it open for the next one"""
+        wrapper = DatabaseWrapper(
+            {**connection.settings_dict, 'POOL': {'MAX_SIZE': 1}},
+            alias=connection.alias,
+        )
+        self.addCleanup(drain_pools, connection.settings_dict['NAME'])
+        pids = []
+
+        for _ in range(2):
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT pg_backend_pid()')
+                pids.append(cursor.fetchone()[0])
+            wrapper.close()
+
+        self.assertEqual(pids[0], pids[1])
+        stats = wrapper.pool.stats()
+        self.assertEqual((stats['connects'], stats['reuses']), (1, 1))
+        self.assertIn(stats, pool_stats()[connection.alias])
+
+
+class DatabasePoolViewTests(TestCase):
+    """Test the pool statistics endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_admin_only(self):
+        """only staff see the statistics"""
+        user = get_user_model().objects.create_user(
+            email='pool@example.com', password='pass1234',
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.get(POOL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stats(self):
+        """pools are listed per database alias"""
+        admin = get_user_model().objects.create_superuser(
+            email='admin@example.com', password='pass1234',
+        )
+        self.client.force_authenticate(admin)
+
+        res = self.client.get(POOL_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('pid', res.data)
+        self.assertIsInstance(res.data['pools'], dict)
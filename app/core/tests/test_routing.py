@@ -0,0 +1,179 @@
+"""
+Tests for routing reads to replicas.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.db.routing import ReplicaRoutingMiddleware
+from core.models import Recipe
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class ReplicaView:
+    read_replica = True
+
+
+class PrimaryView:
+    pass
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DB_PRIMARY_PIN_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Test which database the reads of a request go to."""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.factory = RequestFactory()
+
+    def reads_from(self, request, view_class=ReplicaView, write=False):
+        """run a request through the middleware, return its read database"""
+        seen = []
+
+        def view(request):
+            if write:
+                router.db_for_write(Recipe)
+            seen.append(router.db_for_read(Recipe))
+            return HttpResponse()
+        view.cls = view_class
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+        middleware = ReplicaRoutingMiddleware(get_response)
+
+        middleware(request)
+        return seen[0]
+
+    def test_outside_requests(self):
+        """management commands and the like use the primary"""
+        self.assertEqual(router.db_for_read(Recipe), 'default')
+        self.assertEqual(router.db_for_write(Recipe), 'default')
+
+    def test_safe_request(self):
+        """reads of safe requests to replica views go to a replica"""
+        self.assertEqual(self.reads_from(self.factory.get('/')), 'replica')
+        self.assertEqual(self.reads_from(self.factory.head('/')), 'replica')
+
+    def test_other_views(self):
+        """views have to opt in"""
+        read = self.reads_from(self.factory.get('/'), PrimaryView)
+
+        self.assertEqual(read, 'default')
+
+    def test_unsafe_request(self):
+        """reads of writing requests go to the primary"""
+        self.assertEqual(self.reads_from(self.factory.post('/')), 'default')
+
+    def test_read_after_write(self):
+        """a client that wrote reads from the primary for a while"""
+        token = {'HTTP_AUTHORIZATION': 'Token abc'}
+        self.reads_from(self.factory.post('/', **token))
+
+        same_client = self.reads_from(self.factory.get('/', **token))
+        same_ip = self.reads_from(self.factory.get('/'))
+        other = self.reads_from(
+            self.factory.get('/', REMOTE_ADDR='10.0.0.2'),
+        )
+
+        self.assertEqual(same_client, 'default')
+        self.assertEqual(same_ip, 'default')
+        self.assertEqual(other, 'replica')
+
+    def test_write_during_read(self):
+        """a write sends the rest of the request to the primary"""
+        read = self.reads_from(self.factory.get('/'), write=True)
+
+        self.assertEqual(read, 'default')
+        self.assertEqual(self.reads_from(self.factory.get('/')), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """nothing changes without replicas"""
+        self.assertEqual(self.reads_from(self.factory.get('/')), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaQueryTests(TransactionTestCase):
+    """Test recipe requests against a replica mirroring the test database."""
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        connections.settings['replica'] = {
+            **connections['default'].settings_dict,
+            'TEST': {'MIRROR': 'default'},
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        user = get_user_model().objects.create_user(
+            email='replica@example.com', password='pass1234',
+        )
+        Recipe.objects.create(user=user, title='Soup', time_minitues=5,
+                              price='1.00')
+        token = Token.objects.create(user=user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_list_from_replica(self):
+        """a list only queries the replica"""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0]['title'], 'Soup')
+        self.assertEqual(len(primary), 0)
+        self.assertGreater(len(replica), 0)
+
+    def test_replica_responses_not_cached(self):
+        """lists read from a replica get no etag and are not cached"""
+        caches['recipe'].clear()
+        self.addCleanup(caches['recipe'].clear)
+
+        res = self.client.get(RECIPE_URL)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', res)
+        self.assertGreater(len(replica), 0)
+
+    def test_write_then_read_from_primary(self):
+        """a client reads its own writes from the primary"""
+        payload = {'title': 'Stew', 'time_minitues': 5, 'price': '1.00',
+                   'description': 'hot'}
+        created = self.client.post(RECIPE_URL, payload)
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(replica), 0)
+        self.assertIn('ETag', res)
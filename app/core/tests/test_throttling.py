@@ -0,0 +1,188 @@
+"""
+Tests for token bucket throttling.
+"""
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import throttling
+from core.throttling import (
+    LocalBucketStore,
+    clear_local_stores,
+    get_store,
+    parse_rate,
+)
+
+TOKEN_URL = reverse('user:token')
+CREATE_USER_URL = reverse('user:create')
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def throttle_rates(**rates):
+    """REST_FRAMEWORK settings with only the given throttle rates"""
+    return {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}
+
+
+class BucketStoreTests(SimpleTestCase):
+    """Test the bucket arithmetic."""
+
+    def test_parse_rate(self):
+        """rates are a capacity per period"""
+        self.assertEqual(parse_rate('10/min'), (10, 60))
+        self.assertEqual(parse_rate('3/hour'), (3, 3600))
+
+    @patch('core.throttling.time.monotonic')
+    def test_burst_then_refill(self, patched_monotonic):
+        """a full bucket allows a burst, then refills at the rate"""
+        store = LocalBucketStore()
+        patched_monotonic.return_value = 100.0
+
+        waits = [store.consume('key', 3, 0.5) for _ in range(4)]
+
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertEqual(waits[3], 2)
+        patched_monotonic.return_value = 102.0
+        self.assertEqual(store.consume('key', 3, 0.5), 0)
+        self.assertGreater(store.consume('key', 3, 0.5), 0)
+
+    def test_bounded(self):
+        """the least recently used buckets are dropped"""
+        store = LocalBucketStore(max_size=2)
+
+        for key in ('a', 'b', 'c'):
+            store.consume(key, 1, 1)
+
+        self.assertEqual(list(store._buckets), ['b', 'c'])
+
+    def test_store_per_scope(self):
+        """buckets of one scope cannot evict those of another"""
+        self.assertIs(get_store('login_ip'), get_store('login_ip'))
+        self.assertIsNot(get_store('login_ip'), get_store('login_account'))
+
+
+class ThrottleTests(TestCase):
+    """Test throttling the auth and recipe endpoints."""
+
+    def setUp(self):
+        clear_local_stores()
+        self.addCleanup(clear_local_stores)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='throttle@example.com',
+            password='pass1234',
+        )
+        self.payload = {'email': 'throttle@example.com', 'password': 'wrong'}
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(login_account='2/min'))
+    def test_login_account_throttled(self):
+        """failed logins for one account are limited across ips"""
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            res = self.client.post(TOKEN_URL, self.payload, REMOTE_ADDR=ip)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.assertNumQueries(0):
+            res = self.client.post(
+                TOKEN_URL,
+                {**self.payload, 'email': 'THROTTLE@example.com'},
+                REMOTE_ADDR='10.0.0.3',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(login_ip='1/min'))
+    def test_login_ip_throttled(self):
+        """one ip cannot try many accounts"""
+        self.client.post(TOKEN_URL, self.payload)
+
+        res = self.client.post(
+            TOKEN_URL, {**self.payload, 'email': 'other@example.com'},
+        )
+        other = self.client.post(TOKEN_URL, self.payload,
+                                 REMOTE_ADDR='10.0.0.9')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(login_ip='1/min'))
+    def test_forwarded_for_ignored(self):
+        """clients cannot pick their ip without a proxy in front"""
+        self.client.post(TOKEN_URL, self.payload)
+
+        res = self.client.post(TOKEN_URL, self.payload,
+                               HTTP_X_FORWARDED_FOR='10.0.0.9')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(login_account='1/min'))
+    def test_login_without_object_body(self):
+        """a json body that is not an object is rejected, not a crash"""
+        res = self.client.post(TOKEN_URL, ['a', 'b'], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(signup_ip='1/hour'))
+    def test_signup_throttled(self):
+        """sign ups are limited per ip"""
+        payload = {'email': 'new@example.com', 'password': 'pass1234',
+                   'name': 'New'}
+        self.client.post(CREATE_USER_URL, payload)
+
+        res = self.client.post(
+            CREATE_USER_URL, {**payload, 'email': 'new2@example.com'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(
+        REST_FRAMEWORK=throttle_rates(recipe_write='1/min',
+                                      recipe_upload='1/min'),
+        AUTH_TOKEN_CACHE_TTL=0,
+    )
+    def test_recipe_writes_throttled_per_token(self):
+        """writes are limited per token before it is looked up, reads not"""
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        payload = {'title': 'Soup', 'time_minitues': 5, 'price': '1.00',
+                   'description': 'hot'}
+        self.assertEqual(self.client.post(RECIPE_URL, payload).status_code,
+                         status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(0):
+            res = self.client.post(RECIPE_URL, payload)
+        listed = self.client.get(RECIPE_URL)
+        recipe_id = listed.data['results'][0]['id']
+        upload = self.client.post(
+            reverse('recipe:recipe-upload-image', args=[recipe_id]),
+            {'image': 'notanimage'},
+            format='multipart',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(listed.status_code, status.HTTP_200_OK)
+        self.assertEqual(upload.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(
+        REST_FRAMEWORK=throttle_rates(login_account='1/min'),
+        THROTTLE_STORE='cache',
+    )
+    def test_cache_store(self):
+        """buckets can live in a django cache"""
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.client.post(TOKEN_URL, self.payload)
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(any(
+            store._buckets for store in throttling._local_stores.values()
+        ))
@@ -0,0 +1,210 @@
+"""
+Token bucket throttling.
+
+Every scope has a rate like '10/min' in DEFAULT_THROTTLE_RATES: a bucket
+holds up to 10 tokens and refills at 10 per minute, so clients may burst
+up to the capacity and then continue at the refill rate. Buckets live in
+process memory ('local') or in a Django cache ('cache', e.g. a file based
+cache shared by the workers of a host), picked with THROTTLE_STORE.
+
+Local buckets are kept per scope, so clients churning through ips can
+only evict the buckets of ip scopes, not those of login_account. Client
+ips are REMOTE_ADDR unless NUM_PROXIES says how many proxies in front of
+the app append to X-Forwarded-For.
+
+Views using ThrottleFirstMixin check their throttles before
+authentication, so a rejected request costs a dict lookup and no
+database work.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from user.tokens import InvalidAccessToken, read_access_token
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """(capacity, seconds) of a rate like '10/min'"""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+def _refill(state, capacity, rate, now):
+    """tokens after refilling a bucket state up to now"""
+    if state is None:
+        return capacity
+    tokens, updated = state
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class LocalBucketStore:
+    """buckets in a bounded dict shared by the threads of a process"""
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        """take a token, return 0 or the seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens = _refill(self._buckets.get(key), capacity, rate, now)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """buckets in a django cache, approximate when workers race"""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def consume(self, key, capacity, rate):
+        """take a token, return 0 or the seconds until one is available"""
+        cache = caches[self.alias]
+        now = time.time()
+        tokens = _refill(cache.get(key), capacity, rate, now)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        cache.set(
+            key,
+            (tokens - 1 if not wait else tokens, now),
+            timeout=int(capacity / rate) + 1,
+        )
+        return wait
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+_local_stores = {}
+_local_stores_lock = threading.Lock()
+
+
+def get_store(scope):
+    """the bucket store of a scope selected by THROTTLE_STORE"""
+    if settings.THROTTLE_STORE == 'cache':
+        return CacheBucketStore(settings.THROTTLE_CACHE_ALIAS)
+    with _local_stores_lock:
+        store = _local_stores.get(scope)
+        if store is None:
+            store = _local_stores[scope] = LocalBucketStore()
+        return store
+
+
+def clear_local_stores():
+    with _local_stores_lock:
+        stores = list(_local_stores.values())
+    for store in stores:
+        store.clear()
+
+
+def reset_throttles(*, setting, **kwargs):
+    """forget local buckets when throttle settings change in tests"""
+    if setting in ('REST_FRAMEWORK', 'THROTTLE_STORE'):
+        clear_local_stores()
+
+
+setting_changed.connect(reset_throttles)
+
+
+class BucketThrottle(BaseThrottle):
+    """token bucket per client ip for the class's scope"""
+    scope = None
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        key = self.get_key(request, view)
+        if rate is None or key is None:
+            return True
+        capacity, period = parse_rate(rate)
+        self.wait_time = get_store(self.scope).consume(
+            f'throttle:{self.scope}:{key}', capacity, capacity / period,
+        )
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class CredentialThrottle(BucketThrottle):
+    """bucket per account, identified by its credential without a query
+
+    Access tokens share the bucket of their user however often they are
+    refreshed. Requests without an Authorization header share their ip's
+    bucket.
+    """
+
+    def get_key(self, request, view):
+        header = request.META.get('HTTP_AUTHORIZATION')
+        if not header:
+            return super().get_key(request, view)
+        keyword, _, credential = header.partition(' ')
+        if keyword.lower() == 'bearer':
+            try:
+                return 'user:%d' % read_access_token(credential.strip())[0]
+            except InvalidAccessToken:
+                pass
+        return hashlib.sha256(header.encode()).hexdigest()[:32]
+
+
+class LoginIPThrottle(BucketThrottle):
+    scope = 'login_ip'
+
+
+class LoginAccountThrottle(BucketThrottle):
+    """bucket per email being logged into, whatever the client's ip"""
+    scope = 'login_account'
+
+    def get_key(self, request, view):
+        if not isinstance(request.data, dict):
+            return None
+        email = request.data.get('email')
+        if not isinstance(email, str) or not email:
+            return None
+        return hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+
+
+class SignupIPThrottle(BucketThrottle):
+    scope = 'signup_ip'
+
+
+class RecipeWriteThrottle(CredentialThrottle):
+    scope = 'recipe_write'
+
+
+class RecipeUploadThrottle(CredentialThrottle):
+    scope = 'recipe_upload'
+
+
+class ThrottleFirstMixin:
+    """check throttles before authentication instead of after permissions"""
+
+    def initial(self, request, *args, **kwargs):
+        self.check_throttles(request)
+        self.throttles_checked = True
+        super().initial(request, *args, **kwargs)
+
+    def check_throttles(self, request):
+        if not getattr(self, 'throttles_checked', False):
+            super().check_throttles(request)
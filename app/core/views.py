@@ -0,0 +1,24 @@
+"""views for monitoring the service"""
+import os
+
+from drf_spectacular.utils import extend_schema
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.db.pool import pool_stats
+from user.authentication import CachedTokenAuthentication
+
+
+@extend_schema(exclude=True)
+class DatabasePoolView(APIView):
+    """connection pool statistics of the process serving the request"""
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SessionAuthentication,
+    ]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'pools': pool_stats()})
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipe'
+
+    def ready(self):
+        from django.db.models import CharField
+        from recipe import signals  # noqa: F401
+        from recipe.trigram import TrigramWordSimilar
+
+        CharField.register_lookup(TrigramWordSimilar)
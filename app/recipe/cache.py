@@ -0,0 +1,191 @@
+"""per user versioned response cache for recipe apis"""
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.db.routing import reading_from_replica
+
+
+class CacheStats:
+    """hit and miss counters for the response cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """zero every counter"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def incr(self, name):
+        """increment a counter by name"""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        """return a snapshot of the counters"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+
+stats = CacheStats()
+
+_local = threading.local()
+
+
+def get_cache():
+    """return the cache backend used for recipe responses"""
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f'recipe:version:{user_id}'
+
+
+def _new_version():
+    """seed a version that does not collide with an evicted counter"""
+    return int(time.time() * 1000000)
+
+
+def get_user_version(user_id):
+    """return the current cache version for a user"""
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_user_version(user_id):
+    """move a user to a new version, orphaning their cached entries"""
+    cache = get_cache()
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+    stats.incr('invalidations')
+
+
+def invalidate_user(user_id):
+    """invalidate a user's entries now and again once the write commits"""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.add(user_id)
+        return
+    bump_user_version(user_id)
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+@contextmanager
+def bulk_invalidation():
+    """collapse invalidations inside the block into one per user"""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = set()
+    try:
+        yield
+    finally:
+        user_ids, _local.pending = _local.pending, None
+        for user_id in user_ids:
+            invalidate_user(user_id)
+
+
+def response_cache_key(request):
+    """build the cache key for a request from user, version and url"""
+    user_id = request.user.pk
+    version = get_user_version(user_id)
+    url = f'{request.get_host()}{request.get_full_path()}'
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f'recipe:response:{user_id}:{version}:{digest}'
+
+
+def response_etag(request):
+    """build a strong etag from the user's version instead of the body"""
+    user_id = request.user.pk
+    version = get_user_version(user_id)
+    source = (
+        f'{user_id}:{version}:{request.get_host()}'
+        f'{request.get_full_path()}:{request.accepted_media_type}'
+    )
+    return '"%s"' % hashlib.sha1(source.encode()).hexdigest()
+
+
+def etag_matches(request, etag):
+    """check the request's If-None-Match header against an etag"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in etags)
+
+
+class ConditionalGetMixin:
+    """answer lists with 304 when the client is already up to date"""
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """run the handler unless the client's etag is still current"""
+        etag = response_etag(request)
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            if reading_from_replica():
+                # a lagging replica may predate the version in the etag
+                etag = None
+        if etag is not None:
+            response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class CachedListMixin:
+    """serve list responses from the per user response cache
+
+    Responses read from a replica are not cached, the replica may not have
+    the write that moved the user to the version in the key yet.
+    """
+
+    def list(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            stats.incr('hits')
+            return Response(data)
+
+        stats.incr('misses')
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200 and not reading_from_replica():
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,101 @@
+"""fast read only serialization of recipe listings
+
+Builds the same payload as RecipeSerializer straight from ``.values()``
+rows, with one grouped query for the tag and ingredient relations.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import CharField, Value
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from core.models import Recipe
+from recipe.serializers import (
+    RecipeDetailSerializer,
+    RecipeSerializer,
+    selected_fields,
+)
+
+RELATIONS = ('tags', 'ingredients')
+
+_price_field = serializers.DecimalField(max_digits=5, decimal_places=2)
+
+
+def _relation_query(name, recipe_ids):
+    """values query returning (relation, recipe, through, id, name) rows"""
+    field = getattr(Recipe, name).field
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    return through.objects.filter(
+        **{f'{source}_id__in': recipe_ids}
+    ).annotate(
+        relation=Value(name, output_field=CharField()),
+    ).values_list(
+        'relation',
+        f'{source}_id',
+        'id',
+        f'{target}_id',
+        f'{target}__name',
+    )
+
+
+def load_relations(recipe_ids, relations=RELATIONS):
+    """fetch related items for many recipes in a single query"""
+    grouped = {name: defaultdict(list) for name in relations}
+    if not recipe_ids or not relations:
+        return grouped
+    queries = [_relation_query(name, recipe_ids) for name in relations]
+    query = queries[0].union(*queries[1:], all=True).order_by('id')
+    for relation, recipe_id, _, item_id, item_name in query:
+        grouped[relation][recipe_id].append(
+            {'id': item_id, 'name': item_name}
+        )
+    return grouped
+
+
+def recipe_rows(queryset, fields, ordering=()):
+    """turn a recipe queryset into a values queryset for the fields"""
+    columns = [name for name in fields if name not in RELATIONS]
+    extra = [name.lstrip('-') for name in ordering]
+    return queryset.prefetch_related(None).values(
+        *dict.fromkeys(['id', *columns, *extra])
+    )
+
+
+def serialize_rows(rows, fields):
+    """build recipe dicts in RecipeDetailSerializer field order"""
+    order = RecipeDetailSerializer.Meta.fields
+    names = [name for name in order if name in fields]
+    relations = [name for name in RELATIONS if name in fields]
+    grouped = load_relations([row['id'] for row in rows], relations)
+    data = []
+    for row in rows:
+        item = {}
+        for name in names:
+            if name in grouped:
+                item[name] = grouped[name].get(row['id'], [])
+            elif name == 'price':
+                item[name] = _price_field.to_representation(row[name])
+            else:
+                item[name] = row[name]
+        data.append(item)
+    return data
+
+
+class FastListMixin:
+    """serve recipe lists without instantiating models or serializers"""
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RECIPE_FAST_LIST:
+            return super().list(request, *args, **kwargs)
+
+        fields = selected_fields(request, RecipeSerializer.Meta.fields)
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = recipe_rows(queryset, fields, queryset.query.order_by)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serialize_rows(page, fields))
+        return Response(serialize_rows(list(rows), fields))
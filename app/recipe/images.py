@@ -0,0 +1,211 @@
+"""resized variants of uploaded recipe images
+
+Uploads are stored as is. Thumbnail, medium and large copies in JPEG and
+WebP are rendered once the upload's transaction commits, on a small
+thread pool, so Pillow never decodes or resizes on a request thread.
+
+Jobs only live in the process that queued them, so a restart loses the
+ones still waiting. Recipes left with an image but no variants are picked
+up again by the render_recipe_images command.
+
+Content addressed images (see core.storage) may be shared by several
+recipes. Their variants are named after the same digest and rendered once,
+and the files are released when the last recipe referring to them lets go.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from core.models import Recipe
+from core.storage import is_content_addressed
+from recipe.cache import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {'large': 1280, 'medium': 640, 'thumbnail': 160}
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+VARIANT_FORMATS = {ext: fmt for fmt, (ext, _) in FORMATS.items()}
+VARIANT_PATTERN = re.compile(
+    rf'_({"|".join(VARIANTS)})(_\w+)?\.({"|".join(VARIANT_FORMATS)})$'
+)
+RELEASE_GRACE = 600
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """return the shared worker pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+        return _executor
+
+
+def image_storage():
+    """storage backing the recipe image field"""
+    return Recipe._meta.get_field('image').storage
+
+
+def variant_name(name, variant, ext):
+    """storage name of a variant next to the original"""
+    root, _ = os.path.splitext(name)
+    return f'{root}_{variant}.{ext}'
+
+
+def parse_variant_name(name):
+    """(variant, fmt) of a variant file name, None for other files"""
+    match = VARIANT_PATTERN.search(name)
+    if match is None:
+        return None
+    variant, _, ext = match.groups()
+    return variant, VARIANT_FORMATS[ext]
+
+
+def _flatten(image):
+    """drop transparency onto a white background"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variants(name, storage=None):
+    """render every variant of a stored image, return {variant: {fmt: name}}"""
+    storage = storage or image_storage()
+    largest = max(VARIANTS.values())
+    with storage.open(name, 'rb') as handle:
+        with Image.open(handle) as original:
+            original.draft('RGB', (largest, largest))
+            image = _flatten(ImageOps.exif_transpose(original))
+
+    variants = {}
+    for variant, size in VARIANTS.items():
+        image.thumbnail((size, size), Image.LANCZOS)
+        for fmt, (ext, options) in FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, format=fmt.upper(), **options)
+            saved = storage.save(
+                variant_name(name, variant, ext),
+                ContentFile(buffer.getvalue()),
+            )
+            variants.setdefault(variant, {})[fmt] = saved
+    return variants
+
+
+def delete_variants(variants, storage=None):
+    """remove rendered variant files"""
+    storage = storage or image_storage()
+    for names in variants.values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def image_references(name):
+    """number of recipes that use a stored image"""
+    return Recipe.objects.filter(image=name).count()
+
+
+def shared_variants(name):
+    """variants already rendered for another recipe with the same image"""
+    return Recipe.objects.filter(image=name).exclude(
+        image_variants={},
+    ).values_list('image_variants', flat=True).first()
+
+
+def release_image(name, storage=None):
+    """delete a content addressed image once no recipe refers to it
+
+    Uploads of an existing file refresh its mtime before their row is
+    saved, so recently touched files are kept for RELEASE_GRACE seconds
+    rather than deleted under a request that is about to use them.
+    """
+    if not is_content_addressed(name) or image_references(name):
+        return
+    storage = storage or image_storage()
+    try:
+        modified = os.path.getmtime(storage.path(name))
+    except FileNotFoundError:
+        return
+    if modified > time.time() - RELEASE_GRACE:
+        return
+    storage.delete(name)
+    for variant in VARIANTS:
+        for ext, _ in FORMATS.values():
+            storage.delete(variant_name(name, variant, ext))
+
+
+def schedule_release(name):
+    """release an image after the transaction that dropped it commits"""
+    if is_content_addressed(name):
+        transaction.on_commit(lambda: release_image(name))
+
+
+def generate_variants(recipe_id, user_id, name):
+    """render variants and attach them if the recipe still has this image
+
+    Returns whether the recipe got its variants.
+    """
+    shared = is_content_addressed(name)
+    variants = shared_variants(name) if shared else None
+    if not variants:
+        try:
+            variants = render_variants(name)
+        except Exception:
+            logger.exception('could not render variants of %s', name)
+            return False
+    updated = Recipe.objects.filter(id=recipe_id, image=name).update(
+        image_variants=variants,
+    )
+    if not updated:
+        if shared:
+            release_image(name)
+        else:
+            delete_variants(variants)
+        return False
+    invalidate_user(user_id)
+    return True
+
+
+def _run_job(*args):
+    """worker entry point with its own short lived db connection"""
+    close_old_connections()
+    try:
+        generate_variants(*args)
+    except Exception:
+        # nobody waits on the future, this is the only trace of it
+        logger.exception('variant job for recipe %s failed', args[0])
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(recipe):
+    """render the recipe image's variants after the transaction commits
+
+    With RECIPE_IMAGE_WORKERS = 0 they are rendered inline instead.
+    """
+    if not recipe.image:
+        return
+    args = (recipe.pk, recipe.user_id, recipe.image.name)
+    if settings.RECIPE_IMAGE_WORKERS <= 0:
+        transaction.on_commit(lambda: generate_variants(*args))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run_job, *args))
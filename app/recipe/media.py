@@ -0,0 +1,201 @@
+"""serving uploaded recipe images
+
+Access is checked in Django: a file is served to the owner of a recipe
+that uses it as its image or as one of its variants, and to staff. The
+bytes themselves are never read by Python. With MEDIA_ACCEL_MODE set, the
+response only names the file and the front proxy delivers it. Otherwise a
+FileResponse is returned, which WSGI servers with a file wrapper send with
+sendfile, limited to the requested byte range.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from drf_spectacular.utils import extend_schema
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.models import Recipe
+from core.storage import is_content_addressed
+from recipe.images import image_storage, parse_variant_name
+from user.authentication import CachedTokenAuthentication
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """(start, end) of a single byte range, None to send the whole file
+
+    Raises ValueError when the range cannot be satisfied. Multiple ranges
+    are answered with the whole file, which RFC 7233 allows.
+    """
+    match = RANGE_PATTERN.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError('empty suffix range')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('range not satisfiable')
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    """whether a range request's If-Range validator is still current"""
+    header = request.META.get('HTTP_IF_RANGE')
+    if not header:
+        return True
+    if header.startswith('"'):
+        return parse_etags(header) == [etag]
+    return parse_http_date_safe(header) == last_modified
+
+
+def media_queryset(name):
+    """recipes that refer to a stored file as image or variant"""
+    recipes = Recipe.objects.filter(image=name)
+    parsed = parse_variant_name(name)
+    if parsed is not None:
+        variant, fmt = parsed
+        recipes = recipes | Recipe.objects.filter(
+            image_variants__contains={variant: {fmt: name}},
+        )
+    return recipes
+
+
+class _RangeFile:
+    """file object limited to a byte range, keeping fileno for sendfile"""
+
+    def __init__(self, handle, start, length):
+        handle.seek(start)
+        self.handle = handle
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.handle.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.handle.fileno()
+
+    def tell(self):
+        return self.handle.tell()
+
+    def close(self):
+        self.handle.close()
+
+
+@extend_schema(exclude=True)
+class MediaView(APIView):
+    """serve a recipe image with range and conditional request support"""
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SessionAuthentication,
+    ]
+    permission_classes = [IsAuthenticated]
+
+    def get_path(self, name):
+        """absolute path of a file the user may read"""
+        storage = image_storage()
+        try:
+            path = storage.path(name)
+        except SuspiciousFileOperation:
+            raise Http404
+        recipes = media_queryset(name)
+        if not self.request.user.is_staff:
+            recipes = recipes.filter(user=self.request.user)
+        if not recipes.exists():
+            raise Http404
+        return path
+
+    def get(self, request, name):
+        path = self.get_path(name)
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            raise Http404
+        if not os.path.isfile(path):
+            raise Http404
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        last_modified = int(stat.st_mtime)
+        validators = HttpResponse()
+        validators['ETag'] = etag
+        validators['Last-Modified'] = http_date(last_modified)
+        if is_content_addressed(name):
+            patch_cache_control(
+                validators, private=True, max_age=IMMUTABLE_MAX_AGE,
+                immutable=True,
+            )
+        else:
+            patch_cache_control(validators, private=True, no_cache=True)
+        conditional = get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+            response=validators,
+        )
+        if conditional is not validators:
+            return conditional
+
+        content_type = mimetypes.guess_type(path)[0]
+        content_type = content_type or 'application/octet-stream'
+        mode = settings.MEDIA_ACCEL_MODE
+        if mode == 'nginx':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = quote(
+                settings.MEDIA_ACCEL_REDIRECT_PREFIX + name
+            )
+        elif mode == 'sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = path
+        else:
+            response = self.file_response(request, path, stat.st_size,
+                                          content_type, etag, last_modified)
+        for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+            response[header] = validators[header]
+        return response
+
+    def file_response(self, request, path, size, content_type, etag,
+                      last_modified):
+        """whole file or one byte range, streamed from the open file"""
+        byte_range = None
+        header = request.META.get('HTTP_RANGE')
+        if header and if_range_matches(request, etag, last_modified):
+            try:
+                byte_range = parse_range(header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        start, end = byte_range or (0, size - 1)
+        status = 206 if byte_range else 200
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type, status=status)
+        else:
+            response = FileResponse(
+                _RangeFile(open(path, 'rb'), start, end - start + 1),
+                content_type=content_type,
+                status=status,
+            )
+        response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return response
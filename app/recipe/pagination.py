@@ -0,0 +1,21 @@
+"""pagination for recipe apis"""
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """keyset pagination over recipes, newest first"""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        """follow the queryset's ordering, e.g. search rank, if it has one"""
+        if queryset.query.order_by:
+            return tuple(queryset.query.order_by)
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """keyset pagination over tags and ingredients by name"""
+    ordering = ('-name', '-id')
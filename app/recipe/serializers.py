@@ -1,6 +1,159 @@
 """serializer for recipi api"""
+from collections import defaultdict
+
+from django.db import connection, transaction
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from core.models import Recipe, Tag, Ingredient
+from recipe.cache import invalidate_user
+from recipe.images import schedule_release, schedule_variants
+
+BULK_BATCH_SIZE = 1000
+
+
+def _parse_field_list(value):
+    """split a comma separated query param into field names"""
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def selected_fields(request, available):
+    """return the fields picked by ?fields= and ?omit= on read requests"""
+    selected = set(available)
+    if request is None or request.method not in SAFE_METHODS:
+        return selected
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    if fields:
+        selected &= _parse_field_list(fields)
+    if omit:
+        selected -= _parse_field_list(omit)
+    return selected
+
+
+def _insert_names(model, user, names):
+    """insert names, skipping existing ones, and return their (id, name)
+
+    Names are inserted in sorted order, so transactions inserting
+    overlapping names take their unique index locks in the same order
+    instead of deadlocking.
+    """
+    quote = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} (user_id, name) '
+        'SELECT %s, name FROM unnest(%s::text[]) AS name ORDER BY name '
+        'ON CONFLICT (user_id, name) DO NOTHING RETURNING id, name'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user.pk, names])
+        return cursor.fetchall()
+
+
+def _existing_names(model, user, names):
+    """{name: id} of the names the user already has"""
+    return {
+        name: pk for pk, name in model.objects.filter(
+            user=user, name__in=names,
+        ).values_list('id', 'name')
+    }
+
+
+def resolve_names(model, user, names):
+    """return {name: obj} for the names, creating missing ones
+
+    Existing names are read first, so resolving names that all exist
+    writes nothing. The rest are inserted with INSERT ... ON CONFLICT; a
+    name a concurrent transaction inserted in between is skipped by the
+    insert and read back once more.
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    found = _existing_names(model, user, names)
+    missing = [name for name in names if name not in found]
+    if missing:
+        found.update(
+            (name, pk) for pk, name in _insert_names(model, user, missing)
+        )
+        missing = [name for name in missing if name not in found]
+    if missing:
+        found.update(_existing_names(model, user, missing))
+    resolved = {}
+    for name in names:
+        obj = model(id=found[name], user_id=user.pk, name=name)
+        obj._state.adding = False
+        obj._state.db = connection.alias
+        resolved[name] = obj
+    return resolved
+
+
+def _insert_links(through, source, target, links):
+    """insert (recipe, target) pairs with one unnest() statement"""
+    quote = connection.ops.quote_name
+    opts = through._meta
+    sql = (
+        f'INSERT INTO {quote(opts.db_table)} '
+        f'({quote(opts.get_field(source).column)}, '
+        f'{quote(opts.get_field(target).column)}) '
+        'SELECT * FROM unnest(%s::bigint[], %s::bigint[]) '
+        'ON CONFLICT DO NOTHING'
+    )
+    recipe_ids, target_ids = zip(*links)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(recipe_ids), list(target_ids)])
+
+
+def sync_links(relation, user, recipes, wanted_items, existing=True):
+    """bring the links of many recipes in line with the requested names
+
+    Names for the whole batch are resolved in one pass and the through
+    table is changed with at most one delete and one insert. Recipes whose
+    items are None are left untouched.
+    """
+    field = Recipe._meta.get_field(relation)
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    pairs = [
+        (recipe, items)
+        for recipe, items in zip(recipes, wanted_items) if items is not None
+    ]
+    if not pairs:
+        return
+    names = [item['name'] for _, items in pairs for item in items]
+    resolved = resolve_names(field.related_model, user, names)
+    current = defaultdict(dict)
+    if existing:
+        rows = through.objects.filter(
+            **{f'{source}_id__in': [recipe.pk for recipe, _ in pairs]}
+        ).values_list('id', f'{source}_id', f'{target}_id')
+        for pk, recipe_id, target_id in rows:
+            current[recipe_id][target_id] = pk
+    stale = []
+    links = []
+    for recipe, items in pairs:
+        wanted = dict.fromkeys(resolved[item['name']].pk for item in items)
+        linked = current[recipe.pk]
+        stale += [
+            pk for target_id, pk in linked.items() if target_id not in wanted
+        ]
+        links += [
+            (recipe.pk, target_id)
+            for target_id in wanted if target_id not in linked
+        ]
+    if stale:
+        through.objects.filter(id__in=stale).delete()
+    if links:
+        _insert_links(through, source, target, links)
+
+
+class SparseFieldsMixin:
+    """drop fields the client did not ask for"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = selected_fields(self.context.get('request'), self.fields)
+        for name in set(self.fields) - selected:
+            self.fields.pop(name)
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -19,7 +172,72 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
         read_only_fields = ['id']
 
-class RecipeSerializer(serializers.ModelSerializer):
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """create and update many recipes with a handful of statements"""
+
+    relations = ('tags', 'ingredients')
+
+    def _pop_relations(self, validated_data, default):
+        """split the relation items off each recipe's attributes"""
+        return {
+            name: [attrs.pop(name, default) for attrs in validated_data]
+            for name in self.relations
+        }
+
+    def create(self, validated_data):
+        """bulk insert the recipes, then link them in one pass"""
+        auth_user = self.context['request'].user
+        relations = self._pop_relations(validated_data, [])
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(**attrs) for attrs in validated_data],
+            batch_size=BULK_BATCH_SIZE,
+        )
+        for name, items in relations.items():
+            sync_links(name, auth_user, recipes, items, existing=False)
+        for recipe in recipes:
+            schedule_variants(recipe)
+        invalidate_user(auth_user.pk)
+        return recipes
+
+    def update(self, instance, validated_data):
+        """bulk update changed columns and diff the links of every recipe"""
+        auth_user = self.context['request'].user
+        relations = self._pop_relations(validated_data, None)
+        changed = []
+        new_images = []
+        fields = set()
+        image_field = Recipe._meta.get_field('image')
+        for recipe, attrs in zip(instance, validated_data):
+            dirty = False
+            previous = recipe.image.name
+            for attr, value in attrs.items():
+                if getattr(recipe, attr) != value:
+                    setattr(recipe, attr, value)
+                    fields.add(attr)
+                    dirty = True
+            if 'image' in attrs and recipe.image.name != previous:
+                # bulk_update doesn't store uploads like save() does
+                image_field.pre_save(recipe, add=False)
+                recipe.image_variants = {}
+                fields.add('image_variants')
+                new_images.append(recipe)
+                schedule_release(previous)
+            if dirty:
+                changed.append(recipe)
+        if changed:
+            Recipe.objects.bulk_update(
+                changed, fields, batch_size=BULK_BATCH_SIZE,
+            )
+        for recipe in new_images:
+            schedule_variants(recipe)
+        for name, items in relations.items():
+            sync_links(name, auth_user, instance, items)
+        invalidate_user(auth_user.pk)
+        return instance
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """serualizer for recipe"""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -28,25 +246,25 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ['id', 'title', 'time_minitues', 'price', 'link', 'tags', 'ingredients']
         read_only_fields = ['id']
+        list_serializer_class = RecipeListSerializer
 
     def _get_or_create_tags(self, tags, recipe):
         """handle getting or creating tags as needed"""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        if tags:
+            auth_user = self.context['request'].user
+            names = [tag['name'] for tag in tags]
+            recipe.tags.add(*resolve_names(Tag, auth_user, names).values())
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """hadle create ingredientwith recipe"""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, create = Ingredient.objects.get_or_create(user=auth_user, **ingredient)
-            recipe.ingredients.add(ingredient_obj)
-
+        if ingredients:
+            auth_user = self.context['request'].user
+            names = [ingredient['name'] for ingredient in ingredients]
+            recipe.ingredients.add(
+                *resolve_names(Ingredient, auth_user, names).values()
+            )
 
+    @transaction.atomic(savepoint=False)
     def create(self, validated_data):
         """create a recipe"""
         tags = validated_data.pop('tags', [])
@@ -54,42 +272,103 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         self._get_or_create_tags(tags, recipe)
         self._get_or_create_ingredients(ingredients, recipe)
+        schedule_variants(recipe)
         return recipe
 
+    def _sync_relation(self, instance, relation, items):
+        """add and remove only the links that differ from the request"""
+        manager = getattr(instance, relation)
+        model = manager.model
+        auth_user = self.context['request'].user
+        names = [item['name'] for item in items]
+        wanted = resolve_names(model, auth_user, names)
+        current = {obj.pk: obj for obj in manager.all()}
+        wanted_ids = {obj.pk for obj in wanted.values()}
+        removed = [obj for pk, obj in current.items() if pk not in wanted_ids]
+        added = [obj for obj in wanted.values() if obj.pk not in current]
+        if removed:
+            manager.remove(*removed)
+        if added:
+            manager.add(*added)
+
+    @transaction.atomic(savepoint=False)
     def update(self, instance, validated_data):
         """update recipe"""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
 
-
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._sync_relation(instance, 'tags', tags)
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._sync_relation(instance, 'ingredients', ingredients)
 
+        changed = []
+        previous = instance.image.name
         for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+            if getattr(instance, attr) != value:
+                setattr(instance, attr, value)
+                changed.append(attr)
 
-        instance.save()
+        if 'image' in changed:
+            instance.image_variants = {}
+            changed.append('image_variants')
+            schedule_release(previous)
+        if changed:
+            instance.save(update_fields=changed)
+        if 'image' in changed:
+            # after save(), which stores the upload under its final name
+            schedule_variants(instance)
         return instance
 
 
+class ImageVariantsField(serializers.Field):
+    """absolute urls of the rendered image variants"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        storage = Recipe._meta.get_field('image').storage
+        urls = {}
+        for variant, names in value.items():
+            urls[variant] = {}
+            for fmt, name in names.items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls[variant][fmt] = url
+        return urls
+
 
 class RecipeDetailSerializer(RecipeSerializer):
     """serilaizer for recipe view"""
+    image_variants = ImageVariantsField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_variants',
+        ]
+
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """serializer for upload images to recipe"""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_variants']
         read_only_fields = ['id']
         extra_kwargs = {"image": {"required": "True"}}
 
-
-
+    def update(self, instance, validated_data):
+        """store the upload and queue rendering of its variants"""
+        previous = instance.image.name
+        validated_data['image_variants'] = {}
+        instance = super().update(instance, validated_data)
+        schedule_variants(instance)
+        if instance.image.name != previous:
+            schedule_release(previous)
+        return instance
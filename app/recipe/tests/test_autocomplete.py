@@ -0,0 +1,73 @@
+"""tests for tag and ingredient autocomplete"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient
+
+TAG_AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
+INGREDIENT_AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
+
+
+def create_user(email='auto@example.com', password='pass1234'):
+    """create and return a user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+class AutocompleteTests(TestCase):
+    """test fuzzy type-ahead over attribute names"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        for name in ('chicken', 'chickpeas', 'chilli', 'cheddar', 'salt'):
+            Ingredient.objects.create(user=self.user, name=name)
+
+    def names(self, url, **params):
+        """call autocomplete and return the matched names"""
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in res.data]
+
+    def test_prefix_matches(self):
+        """typing the start of a word finds it"""
+        names = self.names(INGREDIENT_AUTOCOMPLETE_URL, q='chick')
+
+        self.assertEqual(set(names), {'chicken', 'chickpeas'})
+
+    def test_typo_tolerant(self):
+        """small typos still match"""
+        names = self.names(INGREDIENT_AUTOCOMPLETE_URL, q='chickn')
+
+        self.assertEqual(names[0], 'chicken')
+
+    def test_best_match_first(self):
+        """results are ordered by similarity"""
+        names = self.names(INGREDIENT_AUTOCOMPLETE_URL, q='chilli')
+
+        self.assertEqual(names[0], 'chilli')
+
+    def test_limit(self):
+        """limit caps the number of matches"""
+        names = self.names(INGREDIENT_AUTOCOMPLETE_URL, q='ch', limit=1)
+
+        self.assertEqual(len(names), 1)
+
+    def test_limited_to_user(self):
+        """other users' names never match"""
+        Tag.objects.create(user=create_user('x@example.com'), name='vegan')
+        Tag.objects.create(user=self.user, name='vegetarian')
+
+        names = self.names(TAG_AUTOCOMPLETE_URL, q='veg')
+
+        self.assertEqual(names, ['vegetarian'])
+
+    def test_query_required(self):
+        """an empty query is rejected"""
+        res = self.client.get(INGREDIENT_AUTOCOMPLETE_URL, {'q': ' '})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,164 @@
+"""benchmarks for recipe serialization
+
+Skipped by default, run with::
+
+    RUN_BENCHMARKS=1 python manage.py test recipe.tests.test_benchmarks
+"""
+import os
+import time
+import tracemalloc
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.export import iter_recipe_chunks
+from recipe.fastpath import recipe_rows, serialize_rows
+from recipe.serializers import RecipeSerializer
+
+
+def create_library(user, count, tags=20, ingredients=50):
+    """bulk create recipes with three tags and five ingredients each"""
+    tag_objs = Tag.objects.bulk_create(
+        [Tag(user=user, name=f'tag {i}') for i in range(tags)]
+    )
+    ingredient_objs = Ingredient.objects.bulk_create(
+        [Ingredient(user=user, name=f'ing {i}') for i in range(ingredients)]
+    )
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            user=user,
+            title=f'recipe {i}',
+            time_minitues=i % 90,
+            price=Decimal('9.99'),
+            description='description',
+            link='http://example.com',
+        )
+        for i in range(count)
+    ])
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe_id=r.id, tag_id=tag_objs[(i + j) % tags].id)
+        for i, r in enumerate(recipes) for j in range(3)
+    ])
+    Recipe.ingredients.through.objects.bulk_create([
+        Recipe.ingredients.through(
+            recipe_id=r.id,
+            ingredient_id=ingredient_objs[(i + j) % ingredients].id,
+        )
+        for i, r in enumerate(recipes) for j in range(5)
+    ])
+
+
+def best_of(func, repeat=3):
+    """return the fastest of several timed runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), 'set RUN_BENCHMARKS=1')
+class RecipeListBenchmark(TestCase):
+    """compare RecipeSerializer with the fast row path"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'bench@example.com',
+            'pass1234',
+        )
+        create_library(cls.user, 10000)
+
+    def test_list_serialization(self):
+        """fast path beats the serializer at 1k and 10k rows"""
+        fields = set(RecipeSerializer.Meta.fields)
+        for size in (1000, 10000):
+            queryset = Recipe.objects.filter(
+                user=self.user,
+            ).order_by('-id')[:size]
+
+            def slow():
+                prefetched = queryset.prefetch_related('tags', 'ingredients')
+                return RecipeSerializer(prefetched, many=True).data
+
+            def fast():
+                rows = list(recipe_rows(queryset, fields))
+                return serialize_rows(rows, fields)
+
+            slow_time = best_of(slow)
+            fast_time = best_of(fast)
+            print(
+                f'\n{size} recipes: serializer {slow_time * 1000:.1f}ms, '
+                f'fast path {fast_time * 1000:.1f}ms, '
+                f'speedup {slow_time / fast_time:.1f}x'
+            )
+            self.assertLess(fast_time, slow_time)
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), 'set RUN_BENCHMARKS=1')
+class RecipeBulkCreateBenchmark(TestCase):
+    """time a 10k recipe import through the bulk endpoint"""
+
+    def test_bulk_create_10k(self):
+        """10k recipes import in one request"""
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(
+            'bulk-bench@example.com',
+            'pass1234',
+        ))
+        payload = [
+            {
+                'title': f'recipe {i}',
+                'time_minitues': i % 90,
+                'price': '9.99',
+                'description': 'description',
+                'tags': [{'name': f'tag {(i + j) % 20}'} for j in range(3)],
+                'ingredients': [
+                    {'name': f'ing {(i + j) % 50}'} for j in range(5)
+                ],
+            }
+            for i in range(10000)
+        ]
+        start = time.perf_counter()
+        url = reverse('recipe:recipe-bulk')
+        res = client.post(url, payload, format='json')
+        elapsed = time.perf_counter() - start
+        print(f'\nbulk create 10000 recipes: {elapsed:.2f}s')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.count(), 10000)
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), 'set RUN_BENCHMARKS=1')
+class RecipeExportBenchmark(TestCase):
+    """export memory stays flat as the library grows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'export-bench@example.com',
+            'pass1234',
+        )
+        create_library(cls.user, 20000)
+
+    def test_export_peak_memory(self):
+        """peak memory for 20k recipes is close to the peak for 2k"""
+        peaks = []
+        for size in (2000, 20000):
+            ids = Recipe.objects.filter(
+                user=self.user,
+            ).order_by('id').values('id')[:size]
+            queryset = Recipe.objects.filter(id__in=ids).order_by('id')
+            tracemalloc.start()
+            for _ in iter_recipe_chunks(queryset, chunk_size=1000):
+                pass
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            print(f'\nexport {size} recipes: peak {peaks[-1] / 1e6:.1f}MB')
+        self.assertLess(peaks[1], peaks[0] * 1.5)
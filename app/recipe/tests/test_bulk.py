@@ -0,0 +1,187 @@
+"""tests for the bulk recipe endpoint"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+RECIPE_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def create_user(email='bulk@example.com', password='pass1234'):
+    """create and return a user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+def create_recipe(user, **params):
+    """create and return a recipe"""
+    defaults = {
+        'title': 'sample recipe',
+        'time_minitues': 10,
+        'price': Decimal('5.50'),
+        'description': 'sample description',
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def recipe_payload(i, **params):
+    """build a recipe payload for the bulk endpoint"""
+    payload = {
+        'title': f'recipe {i}',
+        'time_minitues': 10,
+        'price': '5.50',
+        'description': 'sample description',
+        'tags': [{'name': 'dinner'}, {'name': f'tag {i}'}],
+        'ingredients': [{'name': 'salt'}],
+    }
+    payload.update(params)
+    return payload
+
+
+class BulkRecipeTests(TestCase):
+    """test bulk create, update and delete"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """every recipe is created and linked, shared names only once"""
+        payload = [recipe_payload(i) for i in range(3)]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['title'] for item in res.data],
+                         ['recipe 0', 'recipe 1', 'recipe 2'])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(Ingredient.objects.filter(name='salt').count(), 1)
+        for item in res.data:
+            recipe = Recipe.objects.get(id=item['id'])
+            self.assertEqual(recipe.user, self.user)
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(item['ingredients'][0]['name'], 'salt')
+
+    def test_bulk_create_query_count_is_constant(self):
+        """creating 50 recipes costs as many queries as creating 2"""
+        def run(start, count):
+            payload = [
+                recipe_payload(i, ingredients=[{'name': f'salt {start}'}])
+                for i in range(start, start + count)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(run(0, 2), run(100, 50))
+        self.assertEqual(Recipe.objects.count(), 52)
+
+    def test_bulk_create_invalid_item(self):
+        """errors are returned per item and nothing is written"""
+        payload = [recipe_payload(0), recipe_payload(1, price='lots')]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('price', res.data[1])
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_requires_list(self):
+        """a single object is rejected"""
+        res = self.client.post(BULK_URL, recipe_payload(0), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_partial_update(self):
+        """each recipe only gets the fields given for it"""
+        r1 = create_recipe(self.user, title='first')
+        r2 = create_recipe(self.user, title='second')
+        keep = Tag.objects.create(user=self.user, name='keep')
+        r2.tags.add(keep, Tag.objects.create(user=self.user, name='drop'))
+        payload = [
+            {'id': r1.id, 'title': 'first edited'},
+            {'id': r2.id, 'tags': [{'name': 'keep'}, {'name': 'new'}]},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        r1.refresh_from_db()
+        r2.refresh_from_db()
+        self.assertEqual(r1.title, 'first edited')
+        self.assertEqual(r2.title, 'second')
+        self.assertEqual(
+            sorted(r2.tags.values_list('name', flat=True)), ['keep', 'new'],
+        )
+        self.assertEqual(res.data[1]['id'], r2.id)
+
+    def test_bulk_update_other_users_recipe(self):
+        """recipes of other users are reported as not found"""
+        own = create_recipe(self.user)
+        other = create_recipe(create_user('other@example.com'))
+        payload = [
+            {'id': own.id, 'title': 'changed'},
+            {'id': other.id, 'title': 'changed'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('id', res.data[1])
+        own.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(own.title, 'sample recipe')
+        self.assertEqual(other.title, 'sample recipe')
+
+    def test_bulk_delete(self):
+        """listed recipes are deleted"""
+        recipes = [create_recipe(self.user) for _ in range(3)]
+
+        res = self.client.delete(
+            BULK_URL, [recipes[0].id, recipes[2].id], format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            list(Recipe.objects.values_list('id', flat=True)),
+            [recipes[1].id],
+        )
+
+    def test_bulk_delete_unknown_id(self):
+        """nothing is deleted when any id is missing"""
+        recipe = create_recipe(self.user)
+        other = create_recipe(create_user('other@example.com'))
+
+        res = self.client.delete(
+            BULK_URL, [recipe.id, other.id, 'x'], format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('id', res.data[1])
+        self.assertIn('id', res.data[2])
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_bulk_write_invalidates_cached_list(self):
+        """a cached recipe list reflects bulk changes"""
+        self.client.get(RECIPE_URL)
+        self.client.post(BULK_URL, [recipe_payload(0)], format='json')
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
@@ -0,0 +1,150 @@
+"""tests for the per user recipe response cache"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import cache
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_user(email='cache@example.com', password='pass1234'):
+    """create and return a user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+def create_recipe(user, **params):
+    """create and return a recipe"""
+    defaults = {
+        'title': 'sample recipe',
+        'time_minitues': 10,
+        'price': Decimal('5.50'),
+        'description': 'sample description',
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ResponseCacheTests(TestCase):
+    """test caching and invalidation of list responses"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        cache.get_cache().clear()
+        cache.stats.reset()
+
+    def test_repeated_list_served_from_cache(self):
+        """second identical request does not touch the database"""
+        create_recipe(self.user)
+        first = self.client.get(RECIPE_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPE_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(cache.stats.as_dict()['hits'], 1)
+        self.assertEqual(cache.stats.as_dict()['misses'], 1)
+
+    def test_query_params_cached_separately(self):
+        """different query strings get different entries"""
+        create_recipe(self.user)
+        create_recipe(self.user)
+        self.client.get(RECIPE_URL)
+
+        res = self.client.get(RECIPE_URL, {'page_size': 1})
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(cache.stats.as_dict()['misses'], 2)
+
+    def test_cache_is_per_user(self):
+        """users never see each other's cached lists"""
+        create_recipe(self.user, title='mine')
+        self.client.get(RECIPE_URL)
+        other = create_user(email='other@example.com')
+        create_recipe(other, title='theirs')
+
+        self.client.force_authenticate(other)
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.data['results'][0]['title'], 'theirs')
+
+    def test_api_write_invalidates(self):
+        """creating a recipe through the api invalidates the list"""
+        self.client.get(RECIPE_URL)
+        payload = {
+            'title': 'new recipe',
+            'time_minitues': 5,
+            'price': '2.50',
+            'description': 'desc',
+            'tags': [{'name': 'dinner'}],
+        }
+        self.client.post(RECIPE_URL, payload, format='json')
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], 'dinner')
+
+    def test_model_writes_invalidate(self):
+        """direct model writes such as the admin invalidate the lists"""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='lunch')
+        self.client.get(RECIPE_URL)
+        self.client.get(TAGS_URL)
+
+        tag.name = 'brunch'
+        tag.save()
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data['results'][0]['name'], 'brunch')
+
+        recipe.tags.add(tag)
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], 'brunch')
+
+        ingredient = Ingredient.objects.create(user=self.user, name='salt')
+        res = self.client.get(INGREDIENTS_URL)
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)
+
+        recipe.delete()
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.data['results'], [])
+
+    def test_other_user_write_keeps_cache(self):
+        """writes by one user do not invalidate another user's entries"""
+        self.client.get(RECIPE_URL)
+        create_recipe(create_user(email='other@example.com'))
+
+        with self.assertNumQueries(0):
+            self.client.get(RECIPE_URL)
+
+    def test_bulk_invalidation_bumps_once(self):
+        """writes inside bulk_invalidation bump each user once"""
+        with cache.bulk_invalidation():
+            for i in range(5):
+                create_recipe(self.user, title=f'r{i}')
+            self.assertEqual(cache.stats.as_dict()['invalidations'], 0)
+
+        self.assertEqual(cache.stats.as_dict()['invalidations'], 1)
+
+    def test_evicted_version_is_reseeded(self):
+        """losing the version counter does not resurrect old entries"""
+        version = cache.get_user_version(self.user.id)
+        cache.get_cache().delete(f'recipe:version:{self.user.id}')
+
+        self.assertNotEqual(cache.get_user_version(self.user.id), version)
@@ -0,0 +1,120 @@
+"""tests for conditional gets on the recipe apis"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """create and return a recipe"""
+    defaults = {
+        'title': 'sample recipe',
+        'time_minitues': 10,
+        'price': Decimal('5.50'),
+        'description': 'sample description',
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalGetTests(TestCase):
+    """test etag and If-None-Match handling"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'etag@example.com',
+            'pass1234',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def test_list_returns_etag(self):
+        """list responses carry a strong etag"""
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['ETag'].startswith('"'))
+        self.assertIn('private', res['Cache-Control'])
+
+    def test_matching_etag_returns_304_without_queries(self):
+        """a current etag short-circuits before any query"""
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_weak_and_listed_etags_match(self):
+        """If-None-Match accepts weak and comma separated etags"""
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        res = self.client.get(
+            RECIPE_URL,
+            HTTP_IF_NONE_MATCH=f'"stale", W/{etag}',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_changes_etag(self):
+        """a write by the user makes old etags stale"""
+        etag = self.client.get(RECIPE_URL)['ETag']
+        create_recipe(self.user, title='another')
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_retrieve_304_without_queries(self):
+        """recipe detail supports conditional gets"""
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_differs_per_url(self):
+        """etags are not shared between different resources"""
+        other = create_recipe(self.user, title='other')
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+
+        res = self.client.get(detail_url(other.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_attr_lists_support_etags(self):
+        """tag and ingredient lists support conditional gets"""
+        Tag.objects.create(user=self.user, name='vegan')
+        for url in (TAGS_URL, INGREDIENTS_URL):
+            etag = self.client.get(url)['ETag']
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_recipe_has_no_etag(self):
+        """error responses are not tagged"""
+        res = self.client.get(detail_url(self.recipe.id + 1000))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(res.has_header('ETag'))
@@ -0,0 +1,173 @@
+"""query plan tests for recipe filtering on postgres"""
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from rest_framework.request import Request
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import views
+
+USERS = 5
+RECIPES_PER_USER = 4000
+TAGS_PER_USER = 50
+LINKS_PER_RECIPE = 3
+THROUGH_INDEX_SCAN = r'Index (Only )?Scan using \S+ on %s'
+
+
+def build_queryset(viewset_class, user, params):
+    """return the queryset a list request with params would run"""
+    request = Request(RequestFactory().get('/', params))
+    request.user = user
+    viewset = viewset_class(action='list', request=request, format_kwarg=None)
+    return viewset.get_queryset()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'postgres query plans')
+class RecipeFilterPlanTests(TestCase):
+    """filters hit the composite and through table indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user_model = get_user_model()
+        users = [
+            user_model.objects.create_user(f'plan{i}@example.com', 'pass')
+            for i in range(USERS)
+        ]
+        cls.user = users[0]
+        through_tags = []
+        through_ingredients = []
+        for user in users:
+            tags = Tag.objects.bulk_create([
+                Tag(user=user, name=f'tag {i}')
+                for i in range(TAGS_PER_USER)
+            ])
+            ingredients = Ingredient.objects.bulk_create([
+                Ingredient(user=user, name=f'ing {i}')
+                for i in range(TAGS_PER_USER)
+            ])
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    user=user,
+                    title=f'recipe {i}',
+                    time_minitues=10,
+                    price=Decimal('5.00'),
+                    description='description',
+                )
+                for i in range(RECIPES_PER_USER)
+            ])
+            for i, recipe in enumerate(recipes):
+                for j in range(LINKS_PER_RECIPE):
+                    through_tags.append(Recipe.tags.through(
+                        recipe_id=recipe.id,
+                        tag_id=tags[(i + j) % TAGS_PER_USER].id,
+                    ))
+                    through_ingredients.append(Recipe.ingredients.through(
+                        recipe_id=recipe.id,
+                        ingredient_id=ingredients[
+                            (i * 7 + j) % TAGS_PER_USER
+                        ].id,
+                    ))
+        Recipe.tags.through.objects.bulk_create(through_tags)
+        Recipe.ingredients.through.objects.bulk_create(through_ingredients)
+        rare = Recipe.objects.filter(user=cls.user).values('id')[:5]
+        Recipe.objects.filter(id__in=rare).update(title='saffron rice')
+        cls.tags = list(Tag.objects.filter(user=cls.user)[:2])
+        cls.ingredient = Ingredient.objects.filter(user=cls.user).first()
+        with connection.cursor() as cursor:
+            for table in (
+                'core_recipe',
+                'core_tag',
+                'core_ingredient',
+                'core_recipe_tags',
+                'core_recipe_ingredients',
+            ):
+                cursor.execute(f'ANALYZE {table}')
+
+    def explain_page(self, viewset_class, params):
+        """explain the first page of a list request"""
+        queryset = build_queryset(viewset_class, self.user, params)
+        return queryset.prefetch_related(None)[:101].explain()
+
+    def test_recipe_list_uses_user_id_index(self):
+        """the default list walks the (user_id, id) index"""
+        plan = self.explain_page(views.RecipeViewSet, {})
+
+        self.assertIn('core_recipe_user_id_idx', plan)
+        self.assertNotIn('Seq Scan', plan)
+
+    def test_tag_filter_avoids_seq_scans(self):
+        """tag filter is an indexed semi join without distinct"""
+        ids = ','.join(str(tag.id) for tag in self.tags)
+        plan = self.explain_page(views.RecipeViewSet, {'tags': ids})
+
+        self.assertNotIn('Seq Scan', plan)
+        self.assertNotIn('Unique', plan)
+        self.assertNotIn('HashAggregate', plan)
+        self.assertRegex(plan, THROUGH_INDEX_SCAN % 'core_recipe_tags')
+
+    def test_ingredient_filter_avoids_seq_scans(self):
+        """ingredient filter is an indexed semi join"""
+        params = {'ingredients': str(self.ingredient.id)}
+        plan = self.explain_page(views.RecipeViewSet, params)
+
+        self.assertNotIn('Seq Scan', plan)
+        self.assertRegex(plan, THROUGH_INDEX_SCAN % 'core_recipe_ingredients')
+
+    def test_assigned_only_uses_through_index(self):
+        """assigned_only probes the through table by tag id"""
+        plan = self.explain_page(views.TagViewSet, {'assigned_only': '1'})
+
+        self.assertNotIn('Seq Scan on core_recipe_tags', plan)
+        self.assertIn('Semi Join', plan)
+        self.assertRegex(plan, THROUGH_INDEX_SCAN % 'core_recipe_tags')
+
+    def test_search_uses_gin_index(self):
+        """full text search is answered from the gin index"""
+        plan = self.explain_page(views.RecipeViewSet, {'search': 'saffron'})
+
+        self.assertIn('core_recipe_search_idx', plan)
+        self.assertNotIn('Seq Scan', plan)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'postgres query plans')
+class AutocompletePlanTests(TestCase):
+    """autocomplete is served from the user scoped trigram index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user_model = get_user_model()
+        cls.user = user_model.objects.create_user('trgm@example.com', 'pass')
+        other = user_model.objects.create_user('trgm2@example.com', 'pass')
+        for user in (cls.user, other):
+            Ingredient.objects.bulk_create([
+                Ingredient(user=user, name=f'ingredient {i} batch {i % 97}')
+                for i in range(20000)
+            ])
+        Ingredient.objects.create(user=cls.user, name='saffron threads')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_ingredient')
+
+    def test_autocomplete_uses_trigram_index(self):
+        """the word similarity match is an index scan"""
+        request = Request(RequestFactory().get('/', {'q': 'safron'}))
+        request.user = self.user
+        viewset = views.IngrefientViewSet(
+            action='autocomplete',
+            request=request,
+            format_kwarg=None,
+        )
+        response = viewset.autocomplete(request)
+        self.assertEqual(response.data[0]['name'], 'saffron threads')
+
+        queryset = viewset.get_queryset().filter(
+            name__trigram_word_similar='safron',
+        )
+        plan = queryset.explain()
+
+        self.assertIn('core_ingredient_name_trgm_idx', plan)
+        self.assertNotIn('Seq Scan', plan)
@@ -0,0 +1,119 @@
+"""tests for the streaming recipe export"""
+import csv
+import io
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def create_recipe(user, **params):
+    """create and return a recipe"""
+    defaults = {
+        'title': 'sample recipe',
+        'time_minitues': 10,
+        'price': Decimal('5.50'),
+        'description': 'sample description',
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeExportTests(TestCase):
+    """test exporting recipes as ndjson and csv"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'export@example.com',
+            'pass1234',
+        )
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        """request an export and return the response and its body"""
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """each recipe is one json line with its relations"""
+        recipe = create_recipe(self.user, title='Curry')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Dinner'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice'),
+        )
+        create_recipe(self.user, title='Soup')
+
+        res, body = self.export()
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        items = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([item['title'] for item in items], ['Soup', 'Curry'])
+        self.assertEqual(items[1], {
+            'id': recipe.id,
+            'title': 'Curry',
+            'time_minitues': 10,
+            'price': '5.50',
+            'link': '',
+            'description': 'sample description',
+            'tags': [{'id': recipe.tags.get().id, 'name': 'Dinner'}],
+            'ingredients': [
+                {'id': recipe.ingredients.get().id, 'name': 'Rice'},
+            ],
+        })
+
+    def test_export_csv(self):
+        """csv has a header and joins relation names"""
+        recipe = create_recipe(self.user, title='Curry, hot')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Dinner'))
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Spicy'))
+
+        res, body = self.export(type='csv')
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        self.assertIn('recipes.csv', res['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Curry, hot')
+        self.assertEqual(rows[0]['tags'], 'Dinner;Spicy')
+        self.assertEqual(rows[0]['ingredients'], '')
+
+    def test_export_limited_to_user(self):
+        """other users' recipes are not exported"""
+        other = get_user_model().objects.create_user('o@example.com', 'pass')
+        create_recipe(other)
+        create_recipe(self.user, title='Mine')
+
+        _, body = self.export()
+
+        self.assertEqual(len(body.splitlines()), 1)
+
+    def test_export_unknown_type(self):
+        """unsupported formats are rejected"""
+        res = self.client.get(EXPORT_URL, {'type': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_loads_relations_per_chunk(self):
+        """one relation query per chunk, not per recipe"""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        for i in range(5):
+            create_recipe(self.user, title=f'recipe {i}').tags.add(tag)
+
+        res = self.client.get(EXPORT_URL)
+        with self.assertNumQueries(4):
+            lines = b''.join(res.streaming_content).splitlines()
+
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(all(b'Dinner' in line for line in lines))
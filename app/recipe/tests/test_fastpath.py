@@ -0,0 +1,103 @@
+"""tests for the fast read only recipe list"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import cache
+from recipe.fastpath import recipe_rows, serialize_rows
+from recipe.serializers import RecipeSerializer
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def normalize(items):
+    """sort nested relations so payloads compare independent of order"""
+    for item in items:
+        for name in ('tags', 'ingredients'):
+            if name in item:
+                item[name] = sorted(item[name], key=lambda x: x['id'])
+    return items
+
+
+class FastListTests(TestCase):
+    """test parity between the fast path and RecipeSerializer"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'fast@example.com',
+            'pass1234',
+        )
+        self.client.force_authenticate(self.user)
+        tags = [
+            Tag.objects.create(user=self.user, name=f'tag{i}')
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'ing{i}')
+            for i in range(3)
+        ]
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'recipe {i}',
+                time_minitues=i,
+                price=Decimal('4.5') + i,
+                description='desc',
+                link='' if i % 2 else 'http://example.com',
+            )
+            recipe.tags.add(*tags[:i % 3 + 1])
+            recipe.ingredients.add(*ingredients[i % 2:])
+
+    def get_list(self, fast, params=None):
+        """fetch the recipe list with the fast path on or off"""
+        cache.get_cache().clear()
+        with override_settings(RECIPE_FAST_LIST=fast):
+            res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def test_fast_list_matches_serializer(self):
+        """fast output is identical to the serializer output"""
+        slow = self.get_list(False, {'page_size': 3})
+        fast = self.get_list(True, {'page_size': 3})
+
+        self.assertEqual(
+            normalize(fast.json()['results']),
+            normalize(slow.json()['results']),
+        )
+        self.assertEqual(fast.data['next'], slow.data['next'])
+
+    def test_fast_list_respects_sparse_fields(self):
+        """fast output honours ?fields= like the serializer"""
+        params = {'fields': 'id,price,tags'}
+        slow = self.get_list(False, params)
+        fast = self.get_list(True, params)
+
+        self.assertEqual(
+            normalize(fast.json()['results']),
+            normalize(slow.json()['results']),
+        )
+
+    def test_fast_list_query_count(self):
+        """rows and all relations load in two queries"""
+        cache.get_cache().clear()
+        with override_settings(RECIPE_FAST_LIST=True):
+            with self.assertNumQueries(2):
+                self.client.get(RECIPE_URL)
+
+    def test_serialize_rows_matches_serializer(self):
+        """the row serializer matches RecipeSerializer directly"""
+        queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+        fields = set(RecipeSerializer.Meta.fields)
+
+        fast = serialize_rows(list(recipe_rows(queryset, fields)), fields)
+        slow = RecipeSerializer(queryset, many=True).data
+
+        self.assertEqual(normalize(fast), normalize([dict(x) for x in slow]))
@@ -0,0 +1,349 @@
+"""tests for recipe image variants"""
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.models import Recipe
+from core.storage import is_content_addressed
+from recipe import images
+from recipe.serializers import RecipeDetailSerializer
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_upload_url(recipe_id):
+    """create and return an image upload url"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def image_file(size=(2000, 1000), mode='RGB', image_format='JPEG'):
+    """return an in memory image upload"""
+    buffer = BytesIO()
+    Image.new(mode, size).save(buffer, format=image_format)
+    return SimpleUploadedFile(
+        f'photo.{image_format.lower()}',
+        buffer.getvalue(),
+        content_type=f'image/{image_format.lower()}',
+    )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECIPE_IMAGE_WORKERS=0)
+class ImageVariantTests(TestCase):
+    """test rendering variants after an upload"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'images@example.com',
+            'pass1234',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='sample recipe',
+            time_minitues=10,
+            price=Decimal('5.50'),
+            description='sample description',
+        )
+
+    def upload(self, upload):
+        """upload an image and run the on commit callbacks"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            res = self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': upload},
+                format='multipart',
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, callbacks
+
+    def test_upload_returns_before_variants_exist(self):
+        """rendering is deferred until the transaction commits"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': image_file()},
+                format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_variants'], {})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+        for callback in callbacks:
+            callback()
+        self.recipe.refresh_from_db()
+        self.assertEqual(set(self.recipe.image_variants), set(images.VARIANTS))
+
+    def test_variants_rendered(self):
+        """every size and format is stored, downscaled to fit"""
+        self.upload(image_file())
+
+        self.recipe.refresh_from_db()
+        variants = self.recipe.image_variants
+        self.assertEqual(set(variants), set(images.VARIANTS))
+        for variant, size in images.VARIANTS.items():
+            self.assertEqual(set(variants[variant]), {'jpeg', 'webp'})
+            for fmt, name in variants[variant].items():
+                with default_storage.open(name) as handle:
+                    with Image.open(handle) as rendered:
+                        self.assertEqual(rendered.format, fmt.upper())
+                        self.assertEqual(rendered.size, (size, size // 2))
+
+    def test_variants_in_detail(self):
+        """detail responses carry absolute variant urls once ready"""
+        self.upload(image_file())
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        url = res.data['image_variants']['thumbnail']['webp']
+        self.assertTrue(url.startswith('http://testserver/'))
+        self.assertTrue(url.endswith('_thumbnail.webp'))
+
+    def test_transparent_png(self):
+        """images with alpha are flattened for jpeg"""
+        self.upload(image_file(mode='RGBA', image_format='PNG'))
+
+        self.recipe.refresh_from_db()
+        self.assertIn('jpeg', self.recipe.image_variants['medium'])
+
+    def test_replaced_image_discards_stale_variants(self):
+        """variants of an image that was replaced meanwhile are dropped"""
+        self.upload(image_file())
+        self.recipe.refresh_from_db()
+        old_name = self.recipe.image.name
+        self.recipe.image.save('new.jpg', ContentFile(b''), save=True)
+
+        images.generate_variants(self.recipe.id, self.user.id, old_name)
+
+        self.recipe.refresh_from_db()
+        self.assertNotIn(old_name, str(self.recipe.image_variants))
+        root = os.path.splitext(old_name)[0]
+        stale = [
+            name for name in os.listdir(os.path.dirname(
+                default_storage.path(old_name)
+            ))
+            if name.startswith(os.path.basename(root) + '_thumbnail_')
+        ]
+        self.assertEqual(stale, [])
+
+    def test_unreadable_image_is_logged(self):
+        """a file pillow cannot decode leaves the recipe untouched"""
+        self.recipe.image.save('broken.jpg', ContentFile(b'nope'), save=True)
+
+        with self.assertLogs('recipe.images', level='ERROR'):
+            images.generate_variants(
+                self.recipe.id, self.user.id, self.recipe.image.name,
+            )
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def assertVariantsRendered(self, recipe):
+        """every variant of the recipe's stored image exists"""
+        recipe.refresh_from_db()
+        self.assertEqual(set(recipe.image_variants), set(images.VARIANTS))
+        root = os.path.splitext(recipe.image.name)[0]
+        for names in recipe.image_variants.values():
+            for name in names.values():
+                self.assertTrue(name.startswith(root))
+                self.assertTrue(default_storage.exists(name))
+
+    def test_create_with_image(self):
+        """recipes created with an image get variants"""
+        payload = {
+            'title': 'with image',
+            'time_minitues': 5,
+            'price': '1.00',
+            'description': 'sample',
+            'image': image_file(size=(300, 200)),
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                reverse('recipe:recipe-list'), payload, format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertVariantsRendered(Recipe.objects.get(id=res.data['id']))
+
+    def test_patch_image(self):
+        """changing the image through the detail endpoint renders it"""
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(
+                detail_url(self.recipe.id),
+                {'image': image_file(size=(300, 200))},
+                format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertVariantsRendered(self.recipe)
+
+    def test_bulk_image_change(self):
+        """bulk updates store new images and render them"""
+        request = APIRequestFactory().patch('/')
+        request.user = self.user
+        serializer = RecipeDetailSerializer(
+            [self.recipe],
+            data=[{'image': image_file(size=(300, 200))}],
+            many=True,
+            partial=True,
+            context={'request': request},
+        )
+        serializer.is_valid(raise_exception=True)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+
+        self.assertTrue(default_storage.exists(self.recipe.image.name))
+        self.assertVariantsRendered(self.recipe)
+
+    @patch('recipe.images.close_old_connections')
+    @patch('recipe.images.generate_variants', side_effect=OSError('gone'))
+    def test_failed_job_is_logged(self, patched_generate, patched_close):
+        """errors on the worker pool are logged, not lost with the future"""
+        with self.assertLogs('recipe.images', level='ERROR') as logs:
+            images._run_job(self.recipe.id, self.user.id, 'photo.jpg')
+
+        self.assertIn(f'recipe {self.recipe.id} failed', logs.output[0])
+
+    @override_settings(RECIPE_IMAGE_WORKERS=2)
+    @patch('recipe.images.get_executor')
+    def test_rendered_on_worker_pool(self, patched_executor):
+        """with workers configured the job is submitted to the pool"""
+        self.upload(image_file(size=(300, 300)))
+
+        self.recipe.refresh_from_db()
+        patched_executor.return_value.submit.assert_called_once_with(
+            images._run_job,
+            self.recipe.id,
+            self.user.id,
+            self.recipe.image.name,
+        )
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    RECIPE_IMAGE_WORKERS=0,
+    RECIPE_IMAGE_CONTENT_ADDRESSED=True,
+)
+class ContentAddressedImageTests(TestCase):
+    """test sharing identical uploads between recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'shared@example.com',
+            'pass1234',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            Recipe.objects.create(
+                user=self.user,
+                title=f'recipe {i}',
+                time_minitues=10,
+                price=Decimal('5.50'),
+            )
+            for i in range(2)
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, recipe, upload):
+        """upload an image to a recipe and return its stored name"""
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(recipe.id),
+                {'image': upload},
+                format='multipart',
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        return recipe.image.name
+
+    def test_identical_uploads_share_a_file(self):
+        """the same bytes are stored once under their digest"""
+        first = self.upload(self.recipes[0], image_file(size=(300, 200)))
+        second = self.upload(self.recipes[1], image_file(size=(300, 200)))
+
+        self.assertEqual(first, second)
+        self.assertTrue(is_content_addressed(first))
+        directory = os.path.dirname(default_storage.path(first))
+        self.assertEqual(
+            [name for name in os.listdir(directory) if '_' not in name],
+            [os.path.basename(first)],
+        )
+        self.assertEqual(images.image_references(first), 2)
+
+    def test_variants_reused_for_duplicates(self):
+        """a duplicate upload takes the variants that were already rendered"""
+        self.upload(self.recipes[0], image_file(size=(300, 200)))
+
+        with patch('recipe.images.render_variants') as patched_render:
+            self.upload(self.recipes[1], image_file(size=(300, 200)))
+
+        patched_render.assert_not_called()
+        self.assertEqual(
+            self.recipes[1].image_variants,
+            self.recipes[0].image_variants,
+        )
+
+    @patch('recipe.images.RELEASE_GRACE', -1)
+    def test_file_kept_while_referenced(self):
+        """replacing one recipe's image keeps the file the other uses"""
+        name = self.upload(self.recipes[0], image_file(size=(300, 200)))
+        self.upload(self.recipes[1], image_file(size=(300, 200)))
+
+        self.upload(self.recipes[0], image_file(size=(200, 300)))
+
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(images.image_references(name), 1)
+
+    @patch('recipe.images.RELEASE_GRACE', -1)
+    def test_file_released_with_last_reference(self):
+        """deleting the last recipe removes the image and its variants"""
+        name = self.upload(self.recipes[0], image_file(size=(300, 200)))
+        variants = self.recipes[0].image_variants
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].delete()
+
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(
+            default_storage.exists(variants['thumbnail']['webp'])
+        )
+
+    def test_recently_touched_file_kept(self):
+        """a file just uploaded again is not released under the upload"""
+        name = self.upload(self.recipes[0], image_file(size=(300, 200)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].delete()
+
+        self.assertTrue(default_storage.exists(name))
@@ -1,11 +1,13 @@
 """test for ingredients"""
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 
 
@@ -50,7 +52,7 @@ class PrivateIngredietnsApiTest(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredient_limited_to_user(self):
         """list of ingredient limited to auth user"""
@@ -61,9 +63,9 @@ class PrivateIngredietnsApiTest(TestCase):
 
         res = self.client.get(INGREDIENTS_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
-        self.assertEqual(res.data[0]['id'], ingredient.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)
 
     def test_update_incredient(self):
         """test for update increcident"""
@@ -85,13 +87,39 @@ class PrivateIngredietnsApiTest(TestCase):
         ingredients = Ingredient.objects.filter(user=self.user)
         self.assertFalse(ingredients.exists())
 
-
-
-
-
-
-
-
-
-
-
+    def test_filter_ingredients_assigned_to_recipes(self):
+        """test listing ingredients by those assigned to recipes"""
+        ingredient1 = Ingredient.objects.create(user=self.user, name="apples")
+        ingredient2 = Ingredient.objects.create(user=self.user, name="turkey")
+        recipe = Recipe.objects.create(
+            title="apple crumble",
+            time_minitues=5,
+            price=Decimal("4.50"),
+            description="crumble",
+            user=self.user,
+        )
+        recipe.ingredients.add(ingredient1)
+
+        res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
+
+        ids = [item["id"] for item in res.data["results"]]
+        self.assertIn(ingredient1.id, ids)
+        self.assertNotIn(ingredient2.id, ids)
+
+    def test_filtered_ingredients_unique(self):
+        """test filtered ingredients returns a unique list"""
+        ingredient = Ingredient.objects.create(user=self.user, name="eggs")
+        Ingredient.objects.create(user=self.user, name="lentils")
+        for title in ("eggs benedict", "herb eggs"):
+            recipe = Recipe.objects.create(
+                title=title,
+                time_minitues=60,
+                price=Decimal("7.00"),
+                description="eggs",
+                user=self.user,
+            )
+            recipe.ingredients.add(ingredient)
+
+        res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
+
+        self.assertEqual(len(res.data["results"]), 1)
@@ -0,0 +1,216 @@
+"""tests for serving recipe images"""
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.media import parse_range
+
+MEDIA_ROOT = tempfile.mkdtemp()
+CONTENT = bytes(range(256)) * 4
+
+
+def media_url(name):
+    """create and return the url of a stored file"""
+    return reverse('media', args=[name])
+
+
+def create_recipe(user, **params):
+    """create and return a recipe"""
+    defaults = {
+        'title': 'sample recipe',
+        'time_minitues': 10,
+        'price': Decimal('5.50'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ParseRangeTests(TestCase):
+    """test parsing range headers"""
+
+    def test_ranges(self):
+        """closed, open and suffix ranges are clamped to the file"""
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=50-500', 100), (50, 99))
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+
+    def test_whole_file(self):
+        """multiple or malformed ranges fall back to the whole file"""
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('items=0-1', 100))
+
+    def test_unsatisfiable(self):
+        """ranges past the end are rejected"""
+        with self.assertRaises(ValueError):
+            parse_range('bytes=100-', 100)
+        with self.assertRaises(ValueError):
+            parse_range('bytes=-0', 100)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_ACCEL_MODE='')
+class MediaViewTests(TestCase):
+    """test the media view"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'media@example.com',
+            'pass1234',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+        self.recipe.image.save('photo.jpg', ContentFile(CONTENT))
+        self.url = media_url(self.recipe.image.name)
+
+    def test_requires_authentication(self):
+        """anonymous requests are refused"""
+        res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_other_users_files_hidden(self):
+        """files of another user's recipes are not found"""
+        other = get_user_model().objects.create_user('o@example.com', 'pw')
+        self.client.force_authenticate(other)
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unreferenced_file_hidden(self):
+        """files no recipe refers to are not served"""
+        res = self.client.get(media_url('uploads/recipe/../../etc/passwd'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_full_file(self):
+        """the whole file is streamed with validators"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('no-cache', res['Cache-Control'])
+        self.assertTrue(res['ETag'])
+
+    def test_byte_range(self):
+        """a single range is answered with partial content"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT[10:20])
+        self.assertEqual(res['Content-Length'], '10')
+        self.assertEqual(res['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+
+    def test_unsatisfiable_range(self):
+        """ranges past the end get 416"""
+        res = self.client.get(self.url, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+        self.assertEqual(res['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_stale_if_range_sends_whole_file(self):
+        """a range whose validator changed gets the full file"""
+        res = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+
+    def test_not_modified(self):
+        """matching etags and dates get 304 without a body"""
+        etag = self.client.get(self.url)['ETag']
+        last_modified = self.client.get(self.url)['Last-Modified']
+
+        by_etag = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        by_date = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified,
+        )
+
+        self.assertEqual(by_etag.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(by_date.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(by_etag['ETag'], etag)
+
+    def test_modified(self):
+        """an older date gets the file again"""
+        res = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(0))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+
+    def test_variant_served(self):
+        """rendered variants are served to the recipe owner"""
+        storage = Recipe._meta.get_field('image').storage
+        name = storage.save('uploads/recipe/x_thumbnail.webp',
+                            ContentFile(b'webp'))
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image_variants={'thumbnail': {'webp': name}},
+        )
+
+        res = self.client.get(media_url(name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), b'webp')
+
+    @override_settings(RECIPE_IMAGE_CONTENT_ADDRESSED=True)
+    def test_content_addressed_immutable(self):
+        """content addressed files may be cached for good"""
+        self.recipe.image.save('photo.jpg', ContentFile(CONTENT))
+
+        res = self.client.get(media_url(self.recipe.image.name))
+
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('max-age=31536000', res['Cache-Control'])
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+
+    @override_settings(MEDIA_ACCEL_MODE='nginx')
+    def test_nginx_accel_redirect(self):
+        """nginx mode hands the file to the proxy without a body"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'/protected-media/{self.recipe.image.name}',
+        )
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+
+    @override_settings(MEDIA_ACCEL_MODE='sendfile')
+    def test_x_sendfile(self):
+        """sendfile mode names the absolute path"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res['X-Sendfile'], self.recipe.image.path)
+        self.assertEqual(res.content, b'')
+
+    def test_head(self):
+        """head requests get the headers only"""
+        res = self.client.head(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(res.content, b'')
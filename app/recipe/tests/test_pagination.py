@@ -0,0 +1,101 @@
+"""tests for cursor pagination of the recipe apis"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.pagination import RecipeCursorPagination
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def create_recipe(user, **params):
+    """create and return a recipe"""
+    defaults = {
+        'title': 'sample recipe',
+        'time_minitues': 10,
+        'price': Decimal('5.50'),
+        'description': 'sample description',
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipePaginationTests(TestCase):
+    """test keyset pagination of recipes and attrs"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'pages@example.com',
+            'pass1234',
+        )
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, **params):
+        """follow next links and return every page"""
+        pages = []
+        res = self.client.get(url, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append(res.data['results'])
+            if not res.data['next']:
+                return pages
+            res = self.client.get(res.data['next'])
+
+    def test_recipes_paginated_newest_first(self):
+        """pages cover every recipe once in -id order"""
+        recipes = [create_recipe(self.user, title=f'r{i}') for i in range(7)]
+
+        pages = self.walk(RECIPE_URL, page_size=3)
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        ids = [item['id'] for page in pages for item in page]
+        self.assertEqual(ids, sorted((r.id for r in recipes), reverse=True))
+
+    @patch.object(RecipeCursorPagination, 'max_page_size', 2)
+    def test_page_size_capped(self):
+        """page_size above the maximum is clamped"""
+        for i in range(3):
+            create_recipe(self.user, title=f'r{i}')
+
+        res = self.client.get(RECIPE_URL, {'page_size': 50})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_deep_pages_use_keyset(self):
+        """following pages filters on id instead of using offset"""
+        for i in range(5):
+            create_recipe(self.user, title=f'r{i}')
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+        next_url = res.data['next']
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(next_url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertIn('"core_recipe"."id" <', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_tags_paginated_by_name(self):
+        """tags are paginated in -name order"""
+        names = ['apple', 'banana', 'cherry', 'date', 'elder']
+        for name in names:
+            Tag.objects.create(user=self.user, name=name)
+
+        pages = self.walk(TAGS_URL, page_size=2)
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        result = [item['name'] for page in pages for item in page]
+        self.assertEqual(result, sorted(names, reverse=True))
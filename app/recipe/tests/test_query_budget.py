@@ -0,0 +1,193 @@
+"""query budget tests for the recipe api"""
+import re
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipes(user, count, tags_per_recipe=3, ingredients_per_recipe=3):
+    """create recipes with tags and ingredients attached"""
+    tags = [
+        Tag.objects.get_or_create(user=user, name=f'tag {i}')[0]
+        for i in range(tags_per_recipe)
+    ]
+    ingredients = [
+        Ingredient.objects.get_or_create(user=user, name=f'ingredient {i}')[0]
+        for i in range(ingredients_per_recipe)
+    ]
+    recipes = []
+    for i in range(count):
+        recipe = Recipe.objects.create(
+            user=user,
+            title=f'recipe {i}',
+            time_minitues=10,
+            price=Decimal('5.50'),
+            description='sample description',
+        )
+        recipe.tags.add(*tags)
+        recipe.ingredients.add(*ingredients)
+        recipes.append(recipe)
+    return recipes
+
+
+class RecipeQueryBudgetTests(TestCase):
+    """every /api/recipe/ endpoint stays within a fixed query budget"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'budget@example.com',
+            'pass1234',
+        )
+        self.client.force_authenticate(self.user)
+
+    def assertBudget(self, budget, method, url, data=None):
+        """run the request and assert it stays within the budget"""
+        with self.assertNumQueries(budget):
+            res = getattr(self.client, method)(url, data, format='json')
+        return res
+
+    def test_recipe_list_budget_is_constant(self):
+        """listing recipes does not depend on the number of recipes"""
+        create_recipes(self.user, 2)
+        res = self.assertBudget(3, 'get', RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        create_recipes(self.user, 20, tags_per_recipe=5)
+        res = self.assertBudget(3, 'get', RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_recipe_detail_budget(self):
+        """retrieving a recipe loads its relations with one query each"""
+        recipe = create_recipes(self.user, 1, tags_per_recipe=10)[0]
+        res = self.assertBudget(3, 'get', detail_url(recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 10)
+
+    def test_recipe_update_budget(self):
+        """updating scalar fields does not reload relations per item"""
+        recipe = create_recipes(self.user, 1, tags_per_recipe=10)[0]
+        payload = {'title': 'new title'}
+        res = self.assertBudget(6, 'patch', detail_url(recipe.id), payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_recipe_update_unchanged_relations_writes_nothing(self):
+        """resubmitting the same tags and ingredients issues no writes"""
+        recipe = create_recipes(self.user, 1, ingredients_per_recipe=40)[0]
+        payload = {
+            'title': recipe.title,
+            'tags': [{'name': tag.name} for tag in recipe.tags.all()],
+            'ingredients': [
+                {'name': item.name} for item in recipe.ingredients.all()
+            ],
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format='json',
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        writes = [
+            query['sql'] for query in ctx.captured_queries
+            if re.search(r'\b(INSERT|UPDATE|DELETE)\b', query['sql'])
+        ]
+        self.assertEqual(writes, [])
+
+    def test_recipe_update_changes_only_the_diff(self):
+        """swapping one ingredient touches one through row each way"""
+        recipe = create_recipes(self.user, 1, ingredients_per_recipe=40)[0]
+        through = Recipe.ingredients.through
+        names = [item.name for item in recipe.ingredients.order_by('id')]
+        kept = set(through.objects.filter(recipe=recipe).exclude(
+            ingredient__name=names[0],
+        ).values_list('id', flat=True))
+        payload = {
+            'ingredients': [{'name': name} for name in names[1:] + ['salt']],
+        }
+        res = self.client.patch(detail_url(recipe.id), payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        ids = set(through.objects.filter(recipe=recipe).values_list(
+            'id', flat=True,
+        ))
+        self.assertEqual(len(ids), 40)
+        self.assertEqual(len(ids - kept), 1)
+        self.assertEqual(len(res.data['ingredients']), 40)
+
+    def test_recipe_create_budget(self):
+        """creating a recipe without relations"""
+        payload = {
+            'title': 'sample',
+            'time_minitues': 10,
+            'price': '5.50',
+            'description': 'sample description',
+        }
+        res = self.assertBudget(3, 'post', RECIPE_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_recipe_create_with_relations_budget(self):
+        """creating tags and ingredients costs the same for 1 or 30 items"""
+        def payload(count):
+            return {
+                'title': 'sample',
+                'time_minitues': 10,
+                'price': '5.50',
+                'description': 'sample description',
+                'tags': [{'name': f'tag {i}'} for i in range(count)],
+                'ingredients': [
+                    {'name': f'ingredient {i}'} for i in range(count)
+                ],
+            }
+
+        res = self.assertBudget(11, 'post', RECIPE_URL, payload(1))
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res = self.assertBudget(11, 'post', RECIPE_URL, payload(30))
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['ingredients']), 30)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 30)
+
+    def test_recipe_create_with_existing_relations_budget(self):
+        """existing names are resolved with one statement per relation"""
+        create_recipes(self.user, 1, tags_per_recipe=30)
+        payload = {
+            'title': 'sample',
+            'time_minitues': 10,
+            'price': '5.50',
+            'description': 'sample description',
+            'tags': [{'name': f'tag {i}'} for i in range(30)],
+        }
+        res = self.assertBudget(6, 'post', RECIPE_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 30)
+
+    def test_recipe_delete_budget(self):
+        """deleting a recipe does not prefetch its relations"""
+        recipe = create_recipes(self.user, 1, tags_per_recipe=10)[0]
+        res = self.assertBudget(4, 'delete', detail_url(recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_tag_and_ingredient_list_budget(self):
+        """tag and ingredient lists are a single query"""
+        create_recipes(self.user, 1, tags_per_recipe=10)
+        res = self.assertBudget(1, 'get', TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.assertBudget(1, 'get', INGREDIENTS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -72,7 +72,7 @@ class PrivateRecipeAPITest(TestCase):
         recipe = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipe, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """test list of recipe to limited user"""
@@ -83,7 +83,7 @@ class PrivateRecipeAPITest(TestCase):
         recipe = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipe, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_get_recipe_detail(self):
         """tets get recipe details"""
@@ -239,6 +239,22 @@ class PrivateRecipeAPITest(TestCase):
             exists = recipe.tags.filter(name=tag['name'], user=self.user).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_with_repeated_tag(self):
+        """test a name repeated in the payload creates one tag"""
+        payload = {
+            "title": "Dosa",
+            "time_minitues": 20,
+            "price": "4.50",
+            "description": "descripiton",
+            "tags": [{"name": "Breakfast"}, {"name": "Breakfast"}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        tags = Tag.objects.filter(user=self.user)
+        self.assertEqual(tags.count(), 1)
+        self.assertEqual(tags[0].recipe_set.count(), 1)
+
     def test_create_tag_on_update(self):
         """test create tag when updating a recipe"""
         recipe = create_recipe(user=self.user)
@@ -378,6 +394,61 @@ class PrivateRecipeAPITest(TestCase):
 
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_filter_by_tags(self):
+        """test filtering recipes by tags"""
+        r1 = create_recipe(user=self.user, title="veg curry")
+        r2 = create_recipe(user=self.user, title="aubergine")
+        r3 = create_recipe(user=self.user, title="fish and chips")
+        tag1 = Tag.objects.create(user=self.user, name="vegan")
+        tag2 = Tag.objects.create(user=self.user, name="vegetarian")
+        r1.tags.add(tag1)
+        r2.tags.add(tag2)
+        r3.tags.add(tag1, tag2)
+
+        params = {"tags": f"{tag1.id},{tag2.id}"}
+        res = self.client.get(RECIPE_URL, params)
+        ids = [item['id'] for item in res.data['results']]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(ids, [r3.id, r2.id, r1.id])
+
+    def test_filter_by_ingredients(self):
+        """test filtering recipes by ingredients"""
+        r1 = create_recipe(user=self.user, title="posh beans")
+        r2 = create_recipe(user=self.user, title="chicken")
+        r3 = create_recipe(user=self.user, title="red lentil dal")
+        in1 = Ingredient.objects.create(user=self.user, name="feta")
+        in2 = Ingredient.objects.create(user=self.user, name="chicken")
+        r1.ingredients.add(in1)
+        r2.ingredients.add(in2)
+
+        res = self.client.get(RECIPE_URL, {"ingredients": f"{in1.id}"})
+        ids = [item['id'] for item in res.data['results']]
+
+        self.assertEqual(ids, [r1.id])
+        self.assertNotIn(r3.id, ids)
+
+    def test_filter_by_tags_and_ingredients(self):
+        """test combining tag and ingredient filters"""
+        r1 = create_recipe(user=self.user)
+        r2 = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="quick")
+        ing = Ingredient.objects.create(user=self.user, name="egg")
+        r1.tags.add(tag)
+        r1.ingredients.add(ing)
+        r2.tags.add(tag)
+
+        params = {"tags": str(tag.id), "ingredients": str(ing.id)}
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data['results']], [r1.id])
+
+    def test_filter_invalid_ids(self):
+        """test non numeric filter ids are rejected"""
+        res = self.client.get(RECIPE_URL, {"tags": "1,abc"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 class ImageUploadTest(TestCase):
     """test for image upload api"""
     def setUp(self):
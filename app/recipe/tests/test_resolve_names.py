@@ -0,0 +1,127 @@
+"""tests for set based tag and ingredient resolution"""
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Tag
+from recipe.serializers import resolve_names
+
+
+class ResolveNamesTests(TestCase):
+    """test resolve_names"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'resolve@example.com',
+            'pass1234',
+        )
+
+    def test_existing_and_new_names(self):
+        """existing names are reused and missing ones created"""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+
+        with self.assertNumQueries(2):
+            found = resolve_names(
+                Tag, self.user, ['Dinner', 'Vegan', 'Dinner'],
+            )
+
+        self.assertEqual(list(found), ['Dinner', 'Vegan'])
+        self.assertEqual(found['Dinner'].pk, tag.pk)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(found['Vegan'], Tag.objects.get(name='Vegan'))
+
+    def test_existing_names_write_nothing(self):
+        """names that all exist are read without an insert"""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+
+        with CaptureQueriesContext(connection) as ctx:
+            found = resolve_names(Tag, self.user, ['Dinner'])
+
+        self.assertEqual(found['Dinner'].pk, tag.pk)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertTrue(ctx.captured_queries[0]['sql'].startswith('SELECT'))
+
+    def test_names_are_per_user(self):
+        """another user's tag of the same name is not reused"""
+        other = get_user_model().objects.create_user('o@example.com', 'pass')
+        theirs = Tag.objects.create(user=other, name='Dinner')
+
+        found = resolve_names(Tag, self.user, ['Dinner'])
+
+        self.assertNotEqual(found['Dinner'].pk, theirs.pk)
+        self.assertEqual(found['Dinner'].user_id, self.user.pk)
+
+
+class ConcurrentResolveNamesTests(TransactionTestCase):
+    """test two transactions creating the same name"""
+
+    def test_concurrent_creates_share_one_row(self):
+        """the slower writer waits and then reuses the committed row"""
+        user = get_user_model().objects.create_user('race@example.com', 'p')
+        inserted = threading.Event()
+        results = {}
+
+        def first():
+            try:
+                with transaction.atomic():
+                    results['first'] = resolve_names(Tag, user, ['Dinner'])
+                    inserted.set()
+                    threading.Event().wait(0.2)
+            finally:
+                connection.close()
+
+        def second():
+            try:
+                inserted.wait()
+                with transaction.atomic():
+                    results['second'] = resolve_names(Tag, user, ['Dinner'])
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=first),
+                   threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(
+            results['first']['Dinner'].pk,
+            results['second']['Dinner'].pk,
+        )
+        self.assertEqual(Tag.objects.filter(user=user).count(), 1)
+
+    def test_concurrent_creates_in_different_orders(self):
+        """overlapping names listed in any order don't deadlock"""
+        user = get_user_model().objects.create_user('order@example.com', 'p')
+        rounds = 20
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def create(reverse):
+            try:
+                for round_ in range(rounds):
+                    names = [f'name {round_} {i}' for i in range(50)]
+                    if reverse:
+                        names.reverse()
+                    barrier.wait()
+                    try:
+                        with transaction.atomic():
+                            resolve_names(Tag, user, names)
+                    except Exception as exc:
+                        errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=create, args=(reverse,))
+                   for reverse in (False, True)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Tag.objects.filter(user=user).count(), rounds * 50)
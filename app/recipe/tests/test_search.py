@@ -0,0 +1,129 @@
+"""tests for full text search over recipes"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def create_recipe(user, **params):
+    """create and return a recipe"""
+    defaults = {
+        'title': 'sample recipe',
+        'time_minitues': 10,
+        'price': Decimal('5.50'),
+        'description': 'sample description',
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeSearchTests(TestCase):
+    """test ?search= on the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'search@example.com',
+            'pass1234',
+        )
+        self.client.force_authenticate(self.user)
+
+    def search(self, **params):
+        """search and return the result ids"""
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in res.data['results']]
+
+    def test_search_title_and_description(self):
+        """matches on either title or description"""
+        r1 = create_recipe(self.user, title='Chicken curry')
+        r2 = create_recipe(self.user, description='served with chicken')
+        create_recipe(self.user, title='Fruit salad')
+
+        ids = self.search(search='chicken')
+
+        self.assertCountEqual(ids, [r1.id, r2.id])
+
+    def test_title_matches_rank_first(self):
+        """title hits outrank description hits"""
+        in_description = create_recipe(
+            self.user, description='roasted garlic bread'
+        )
+        in_title = create_recipe(self.user, title='Garlic soup')
+
+        ids = self.search(search='garlic')
+
+        self.assertEqual(ids, [in_title.id, in_description.id])
+
+    def test_search_uses_stemming(self):
+        """plural and singular forms match each other"""
+        recipe = create_recipe(self.user, title='Baked potatoes')
+
+        self.assertEqual(self.search(search='potato'), [recipe.id])
+
+    def test_prefix_search(self):
+        """prefix mode matches partial words"""
+        recipe = create_recipe(self.user, title='Mushroom risotto')
+
+        self.assertEqual(self.search(search='mush'), [])
+        self.assertEqual(self.search(search='mush', prefix='1'), [recipe.id])
+
+    def test_search_limited_to_user(self):
+        """other users' recipes never match"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'pass1234',
+        )
+        create_recipe(other, title='Lamb tagine')
+
+        self.assertEqual(self.search(search='lamb'), [])
+
+    def test_vector_updated_on_save(self):
+        """editing the title refreshes the stored vector"""
+        recipe = create_recipe(self.user, title='Pancakes')
+        recipe.title = 'Waffles'
+        recipe.save()
+
+        self.assertEqual(self.search(search='pancakes'), [])
+        self.assertEqual(self.search(search='waffles'), [recipe.id])
+
+    def test_vector_updated_by_queryset_update(self):
+        """bulk updates bypassing save still refresh the vector"""
+        recipe = create_recipe(self.user, title='Porridge')
+        Recipe.objects.filter(id=recipe.id).update(description='oats')
+
+        self.assertEqual(self.search(search='oats'), [recipe.id])
+
+    def test_search_paginates_by_rank(self):
+        """cursor pages follow rank order without repeats"""
+        for i in range(5):
+            create_recipe(
+                self.user,
+                title='Tomato' if i % 2 else f'Dish {i}',
+                description='tomato sauce',
+            )
+        res = self.client.get(RECIPE_URL, {'search': 'tomato', 'page_size': 2})
+        ids = [item['id'] for item in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [item['id'] for item in res.data['results']]
+
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+        titles = [Recipe.objects.get(id=pk).title for pk in ids]
+        self.assertEqual(titles[:2], ['Tomato', 'Tomato'])
+
+    @override_settings(RECIPE_FAST_LIST=True)
+    def test_search_with_fast_list(self):
+        """the fast list path supports search ordering"""
+        recipe = create_recipe(self.user, title='Lemon tart')
+
+        self.assertEqual(self.search(search='lemon'), [recipe.id])
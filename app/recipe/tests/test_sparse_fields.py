@@ -0,0 +1,94 @@
+"""tests for sparse fieldsets on the recipe api"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class SparseFieldsTests(TestCase):
+    """test ?fields= and ?omit= on recipe reads"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sparse@example.com',
+            'pass1234',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='curry',
+            time_minitues=20,
+            price=Decimal('7.25'),
+            description='a long description',
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='thai'))
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='rice')
+        )
+
+    def test_fields_limits_payload(self):
+        """only the requested fields are returned"""
+        res = self.client.get(RECIPE_URL, {'fields': 'id,title,price'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(res.data['results'][0]),
+            {'id', 'title', 'price'},
+        )
+
+    def test_omit_drops_fields(self):
+        """omitted fields are left out of the detail payload"""
+        url = detail_url(self.recipe.id)
+        res = self.client.get(url, {'omit': 'tags,ingredients,description'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('tags', res.data)
+        self.assertNotIn('ingredients', res.data)
+        self.assertNotIn('description', res.data)
+        self.assertEqual(res.data['title'], 'curry')
+
+    def test_dropping_relations_skips_prefetch(self):
+        """omitting nested relations removes their queries"""
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URL, {'omit': 'tags,ingredients'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(2):
+            self.client.get(detail_url(self.recipe.id), {'fields': 'tags'})
+
+    def test_fields_shrink_selected_columns(self):
+        """scalar fields not requested are deferred in sql"""
+        url = detail_url(self.recipe.id)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, {'fields': 'id,title'})
+
+        self.assertEqual(res.data, {'id': self.recipe.id, 'title': 'curry'})
+        sql = ctx.captured_queries[0]['sql']
+        self.assertIn('"core_recipe"."title"', sql)
+        self.assertNotIn('"core_recipe"."description"', sql)
+        self.assertNotIn('"core_recipe"."price"', sql)
+
+    def test_writes_ignore_fields(self):
+        """sparse fieldsets do not affect validation of writes"""
+        url = f"{detail_url(self.recipe.id)}?fields=id"
+        res = self.client.patch(url, {'title': 'new'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'new')
@@ -1,11 +1,13 @@
 """Test for tags api"""
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
 
 from rest_framework import status
 from rest_framework.test import APIClient
-from core.models import Tag
+from core.models import Tag, Recipe
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
@@ -48,7 +50,7 @@ class PrivateTagsAPITests(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """test list of tag limited to user"""
@@ -58,9 +60,9 @@ class PrivateTagsAPITests(TestCase):
         tag = Tag.objects.create(user=self.user, name="confirm")
         res = self.client.get(TAGS_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
 
     def test_update_tag(self):
         """updating a tag"""
@@ -74,6 +76,15 @@ class PrivateTagsAPITests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_update_tag_to_existing_name(self):
+        """renaming onto another tag's name is rejected"""
+        Tag.objects.create(user=self.user, name="Dinner")
+        tag = Tag.objects.create(user=self.user, name="Lunch")
+        res = self.client.patch(detail_url(tag.id), {"name": "Dinner"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, "Lunch")
+
     def test_delete_tag(self):
         """deletr tag"""
         tag = Tag.objects.create(user=self.user, name="afetrsdsdt")
@@ -82,4 +93,41 @@ class PrivateTagsAPITests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         tags = Tag.objects.filter(user=self.user)
-        self.assertFalse(tags.exists())
\ No newline at end of file
+        self.assertFalse(tags.exists())
+
+    def test_filter_tags_assigned_to_recipes(self):
+        """test listing tags by those assigned to recipes"""
+        tag1 = Tag.objects.create(user=self.user, name="apples")
+        tag2 = Tag.objects.create(user=self.user, name="turkey")
+        recipe = Recipe.objects.create(
+            title="apple crumble",
+            time_minitues=5,
+            price=Decimal("4.50"),
+            description="crumble",
+            user=self.user,
+        )
+        recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+
+        ids = [item["id"] for item in res.data["results"]]
+        self.assertIn(tag1.id, ids)
+        self.assertNotIn(tag2.id, ids)
+
+    def test_filtered_tags_unique(self):
+        """test filtered tags returns a unique list"""
+        tag = Tag.objects.create(user=self.user, name="eggs")
+        Tag.objects.create(user=self.user, name="lentils")
+        for title in ("eggs benedict", "herb eggs"):
+            recipe = Recipe.objects.create(
+                title=title,
+                time_minitues=60,
+                price=Decimal("7.00"),
+                description="eggs",
+                user=self.user,
+            )
+            recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+
+        self.assertEqual(len(res.data["results"]), 1)
@@ -0,0 +1,20 @@
+"""pg_trgm word similarity helpers, as added in django 4.0"""
+from django.contrib.postgres.lookups import PostgresOperatorLookup
+from django.db.models import FloatField, Func, Value
+
+
+class TrigramWordSimilar(PostgresOperatorLookup):
+    """match values containing a word similar to the search string"""
+    lookup_name = 'trigram_word_similar'
+    postgres_operator = '%%>'
+
+
+class TrigramWordSimilarity(Func):
+    """word_similarity() between a search string and an expression"""
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+    def __init__(self, string, expression, **extra):
+        if not hasattr(string, 'resolve_expression'):
+            string = Value(string)
+        super().__init__(string, expression, **extra)
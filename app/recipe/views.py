@@ -1,25 +1,204 @@
 """views for recipie api"""
 
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, FloatField, OuterRef
+from django.db.models.functions import Cast
+from drf_spectacular.utils import (
+    extend_schema_view,
+    extend_schema,
+    OpenApiParameter,
+    OpenApiTypes,
+)
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from core.models import Recipe, Tag, Ingredient
+from core.throttling import (
+    RecipeUploadThrottle,
+    RecipeWriteThrottle,
+    ThrottleFirstMixin,
+)
 from recipe import serializers
+from recipe.cache import (
+    CachedListMixin,
+    ConditionalGetMixin,
+    bulk_invalidation,
+)
+from recipe.export import CONTENT_TYPES, export_response
+from recipe.fastpath import FastListMixin, recipe_rows, serialize_rows
+from recipe.trigram import TrigramWordSimilarity
+from recipe.pagination import (
+    RecipeCursorPagination,
+    RecipeAttrCursorPagination,
+)
+from user.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+BULK_MAX_ITEMS = 10000
+
+
+def _params_to_ints(name, value):
+    """convert a comma separated query param to a list of ints"""
+    try:
+        return [int(str_id) for str_id in value.split(',')]
+    except ValueError:
+        raise ValidationError({name: 'expected a comma separated list of ids'})
+
+
+def _search_query(value, prefix=False):
+    """build a full text query, optionally matching word prefixes"""
+    if not prefix:
+        return SearchQuery(value, search_type='websearch', config='english')
+    terms = re.findall(r'\w+', value)
+    if not terms:
+        return None
+    raw = ' & '.join(f'{term}:*' for term in terms)
+    return SearchQuery(raw, search_type='raw', config='english')
+
+
+def _bulk_items(data):
+    """check a bulk request body is a list of a sensible size"""
+    if not isinstance(data, list):
+        raise ValidationError({'non_field_errors': ['expected a list']})
+    if len(data) > BULK_MAX_ITEMS:
+        raise ValidationError({'non_field_errors': [
+            f'at most {BULK_MAX_ITEMS} items per request',
+        ]})
+    return data
+
+
+def _bulk_ids(items, available):
+    """return the ids of bulk items or raise per item errors"""
+    ids = []
+    errors = []
+    for item in items:
+        pk = item.get('id') if isinstance(item, dict) else item
+        if not isinstance(pk, int) or isinstance(pk, bool):
+            errors.append({'id': ['expected a recipe id']})
+        elif pk in ids:
+            errors.append({'id': ['duplicate recipe id']})
+        elif pk not in available:
+            errors.append({'id': ['recipe not found']})
+        else:
+            errors.append({})
+        ids.append(pk)
+    if any(errors):
+        raise ValidationError(errors)
+    return ids
+
+
+def _recipe_link_exists(relation, **lookups):
+    """semi join on a recipe m2m through table"""
+    through = getattr(Recipe, relation).through
+    return Exists(through.objects.filter(**lookups))
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'tags',
+                OpenApiTypes.STR,
+                description='comma separated list of tag ids to filter',
+            ),
+            OpenApiParameter(
+                'ingredients',
+                OpenApiTypes.STR,
+                description='comma separated list of ingredient ids to filter',
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='full text search over title and description',
+            ),
+            OpenApiParameter(
+                'prefix',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='match search terms as word prefixes',
+            ),
+        ]
+    )
+)
+class RecipeViewSet(
+    ThrottleFirstMixin,
+    ConditionalGetMixin,
+    CachedListMixin,
+    FastListMixin,
+    viewsets.ModelViewSet,
+):
     """view for manage recipe apis"""
     serializer_class = serializers.RecipeDetailSerializer
+    read_replica = True
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
 
     def get_queryset(self):
         """returevice recipe for authenticated user"""
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset.filter(
+            user=self.request.user,
+        ).defer('search_vector').order_by('-id')
+        search = self.request.query_params.get('search')
+        if search:
+            prefix = self.request.query_params.get('prefix') == '1'
+            query = _search_query(search, prefix=prefix)
+            if query is None:
+                return queryset.none()
+            queryset = queryset.filter(search_vector=query).annotate(
+                search_rank=Cast(
+                    SearchRank(F('search_vector'), query),
+                    FloatField(),
+                ),
+            ).order_by('-search_rank', '-id')
+        tags = self.request.query_params.get('tags')
+        ingredients = self.request.query_params.get('ingredients')
+        if tags:
+            queryset = queryset.filter(_recipe_link_exists(
+                'tags',
+                recipe_id=OuterRef('pk'),
+                tag_id__in=_params_to_ints('tags', tags),
+            ))
+        if ingredients:
+            queryset = queryset.filter(_recipe_link_exists(
+                'ingredients',
+                recipe_id=OuterRef('pk'),
+                ingredient_id__in=_params_to_ints('ingredients', ingredients),
+            ))
+        if self.action in ('upload_image', 'destroy', 'bulk', 'export'):
+            return queryset
+        relations = ['tags', 'ingredients']
+        if self.action in ('list', 'retrieve'):
+            available = self.get_serializer_class().Meta.fields
+            fields = serializers.selected_fields(self.request, available)
+            relations = [name for name in relations if name in fields]
+            if fields != set(available):
+                columns = fields.difference(relations)
+                queryset = queryset.only('id', *columns)
+        return queryset.prefetch_related(*relations)
+
+    def get_throttles(self):
+        """separate buckets for image uploads and other writes"""
+        if self.action == 'upload_image':
+            return [RecipeUploadThrottle()]
+        if self.request.method not in SAFE_METHODS:
+            return [RecipeWriteThrottle()]
+        return []
 
     def get_serializer_class(self):
         """serializer clas for req"""
@@ -30,10 +209,102 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeImageSerializer
         return self.serializer_class
 
+    def retrieve(self, request, *args, **kwargs):
+        """retrieve a recipe unless the client's etag is current"""
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
     def perform_create(self, serializer):
         """Create a new recipe."""
         serializer.save(user=self.request.user)
 
+    def _bulk_results(self, ids):
+        """list representation of the recipes, in request order"""
+        fields = set(serializers.RecipeSerializer.Meta.fields)
+        rows = recipe_rows(Recipe.objects.filter(id__in=ids), fields)
+        data = serialize_rows(list(rows), fields)
+        by_id = {item['id']: item for item in data}
+        return [by_id[pk] for pk in ids]
+
+    def _bulk_create(self, items):
+        """validate every item, then insert them all"""
+        serializer = self.get_serializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.save(user=self.request.user)
+        return [recipe.id for recipe in recipes]
+
+    def _bulk_update(self, items):
+        """validate every item against its recipe, then update them all"""
+        queryset = self.get_queryset().select_for_update()
+        wanted = [item.get('id') for item in items if isinstance(item, dict)]
+        recipes = queryset.in_bulk(
+            [pk for pk in wanted if isinstance(pk, int)]
+        )
+        ids = _bulk_ids(items, recipes)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids], data=items, many=True, partial=True,
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return ids
+
+    def _bulk_destroy(self, items):
+        """delete every listed recipe"""
+        queryset = self.get_queryset()
+        available = set(queryset.filter(
+            id__in=[pk for pk in items if isinstance(pk, int)],
+        ).values_list('id', flat=True))
+        ids = _bulk_ids(items, available)
+        queryset.filter(id__in=ids).delete()
+
+    @extend_schema(
+        request=serializers.RecipeDetailSerializer(many=True),
+        responses=serializers.RecipeSerializer(many=True),
+        description=(
+            'POST a list of recipes to create, PATCH a list of partial '
+            'recipes with ids to update or DELETE a list of ids. All items '
+            'are applied in one transaction; if any item is invalid nothing '
+            'is written and the errors are returned per item.'
+        ),
+    )
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        """create, update or delete many recipes at once"""
+        items = _bulk_items(request.data)
+        with bulk_invalidation(), transaction.atomic():
+            if request.method == 'DELETE':
+                self._bulk_destroy(items)
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            if request.method == 'POST':
+                ids = self._bulk_create(items)
+                response_status = status.HTTP_201_CREATED
+            else:
+                ids = self._bulk_update(items)
+                response_status = status.HTTP_200_OK
+        return Response(self._bulk_results(ids), status=response_status)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'type',
+                OpenApiTypes.STR, enum=list(CONTENT_TYPES),
+                description='export format, ndjson by default',
+            ),
+        ],
+        responses={(200, media_type): OpenApiTypes.BINARY
+                   for media_type in CONTENT_TYPES.values()},
+    )
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """stream all matching recipes as ndjson or csv"""
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in CONTENT_TYPES:
+            raise ValidationError({'type': [
+                f'expected one of {", ".join(CONTENT_TYPES)}',
+            ]})
+        return export_response(self.get_queryset(), export_type)
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """upload image"""
@@ -46,14 +317,89 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class BaseRecipeAttrViewSet(mixins.UpdateModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet, mixins.DestroyModelMixin):
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'assigned_only',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='filter by items assigned to recipes',
+            ),
+        ]
+    )
+)
+class BaseRecipeAttrViewSet(
+    ConditionalGetMixin,
+    CachedListMixin,
+    mixins.UpdateModelMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+    mixins.DestroyModelMixin,
+):
     """Base class for recipe attrs"""
-    authentication_classes = [TokenAuthentication]
+    read_replica = True
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
 
     def get_queryset(self):
         """filter queryset to auth user"""
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        assigned_only = self.request.query_params.get('assigned_only') == '1'
+        queryset = self.queryset.filter(user=self.request.user)
+        if assigned_only:
+            field = getattr(Recipe, self.recipe_relation).field
+            queryset = queryset.filter(_recipe_link_exists(
+                self.recipe_relation,
+                **{f'{field.m2m_reverse_field_name()}_id': OuterRef('pk')},
+            ))
+        return queryset.order_by('-name', '-id')
+
+    def perform_update(self, serializer):
+        """reject renames onto a name the user already has"""
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({'name': ['this name already exists']})
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                required=True,
+                description='text typed so far',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='number of matches to return',
+            ),
+        ]
+    )
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        """return the closest name matches for type-ahead"""
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            raise ValidationError({'q': 'this parameter is required'})
+        try:
+            limit = int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': 'expected an integer'})
+        limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+
+        queryset = self.get_queryset().filter(
+            name__trigram_word_similar=term,
+        ).annotate(
+            similarity=TrigramWordSimilarity(term, 'name'),
+        ).order_by('-similarity', 'name')[:limit]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -61,12 +407,14 @@ class TagViewSet(BaseRecipeAttrViewSet):
 
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    recipe_relation = 'tags'
 
 
 class IngrefientViewSet(BaseRecipeAttrViewSet):
     """view for ingredient"""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    recipe_relation = 'ingredients'
 
 
 
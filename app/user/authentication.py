@@ -0,0 +1,146 @@
+"""token authentication with an in-process cache
+
+DRF's TokenAuthentication loads the token and its user on every request.
+CachedTokenAuthentication keeps recent lookups in a bounded LRU per
+worker, so a warm worker authenticates without a database round trip.
+
+Deleting a token or saving or deleting a user evicts the affected entries
+in the worker that made the change. Other workers drop them when their
+entries expire, so a revoked token is accepted for at most
+AUTH_TOKEN_CACHE_TTL seconds.
+
+SignedTokenAuthentication accepts the short lived access tokens of
+user.tokens, which need no token lookup. Their users are kept in the
+same cache, so a warm worker rejects a deactivated user without a query
+after at most AUTH_TOKEN_CACHE_TTL seconds, or at once when its tokens
+were revoked through a shared ACCESS_TOKEN_REVOCATION_CACHE.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.exceptions import AuthenticationFailed
+
+from user.tokens import InvalidAccessToken, verify_access_token
+
+
+class TokenCache:
+    """thread safe LRU of token key to (user, token) with a ttl"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """cached (user, token) for a key, None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """remember a lookup, dropping the least recently used entries"""
+        ttl = settings.AUTH_TOKEN_CACHE_TTL
+        size = settings.AUTH_TOKEN_CACHE_SIZE
+        if ttl <= 0 or size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def evict(self, key):
+        """forget one token"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def evict_user(self, user_id):
+        """forget every token of a user"""
+        with self._lock:
+            stale = [
+                key for key, (_, (user, _)) in self._entries.items()
+                if user.pk == user_id
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        """forget everything"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication backed by the per-process token cache"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+        user, token = cached
+        # every request gets its own instances, views may modify them
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """authenticate 'Bearer <access token>' of an active user
+
+    The user is read from the per-process token cache, so only the first
+    request of a user in a worker queries the database.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid bearer header.')
+        try:
+            token = auth[1].decode()
+            user_id = verify_access_token(token)
+        except (UnicodeError, InvalidAccessToken):
+            raise AuthenticationFailed('Invalid or expired access token.')
+        return self.get_user(user_id), token
+
+    def get_user(self, user_id):
+        """the active user of an access token"""
+        key = 'access-user:%d' % user_id
+        cached = token_cache.get(key)
+        if cached is None:
+            user = get_user_model().objects.filter(pk=user_id).first()
+            cached = (user, None)
+            if user is not None:
+                token_cache.set(key, cached)
+        user = cached[0]
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        return copy.copy(user)
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,99 @@
+"""authentication backend that hashes passwords off the request thread
+
+Password hashing is deliberately slow and CPU bound. PooledModelBackend
+runs it on a small thread pool (hashlib releases the GIL while hashing),
+so at most LOGIN_HASH_WORKERS hashes run at once per process however many
+requests arrive. At most LOGIN_HASH_QUEUE more may wait for a worker. Any
+login beyond that fails straight away instead of queueing behind work the
+client will have given up on: the backend returns None like for a wrong
+password and sets request.login_busy, which the token api answers with
+503 and Retry-After. Other callers such as the admin login just see a
+failed login.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """every password hashing slot is taken"""
+
+
+def get_executor():
+    """return the hashing pool and its slots, creating them on first use"""
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = settings.LOGIN_HASH_WORKERS
+            _slots = threading.BoundedSemaphore(
+                workers + settings.LOGIN_HASH_QUEUE
+            )
+            _executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix='login-hash',
+            )
+        return _executor, _slots
+
+
+def run_hashing(func, *args):
+    """run func on the hashing pool, or refuse when it is saturated"""
+    if settings.LOGIN_HASH_WORKERS <= 0:
+        return func(*args)
+    executor, slots = get_executor()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        return executor.submit(func, *args).result()
+    finally:
+        slots.release()
+
+
+def verify_password(password, encoded):
+    """check a password, return (valid, new encoding if it needs a rehash)"""
+    upgraded = []
+    valid = check_password(
+        password,
+        encoded,
+        setter=lambda raw: upgraded.append(make_password(raw)),
+    )
+    return valid, upgraded[0] if upgraded else None
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend verifying passwords on the hashing pool"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        try:
+            return self._authenticate(username, password, **kwargs)
+        except HashingBusy:
+            if request is not None:
+                request.login_busy = True
+            return None
+
+    def _authenticate(self, username, password, **kwargs):
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            # hash anyway so unknown users take as long as known ones
+            run_hashing(make_password, password)
+            return None
+        valid, upgraded = run_hashing(verify_password, password, user.password)
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if upgraded:
+            user.password = upgraded
+            user.save(update_fields=['password'])
+        return user
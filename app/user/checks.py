@@ -0,0 +1,22 @@
+"""system checks for the user app"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches, deploy=True)
+def check_revocation_cache(app_configs, **kwargs):
+    """revoked access tokens have to be seen by every worker"""
+    alias = settings.ACCESS_TOKEN_REVOCATION_CACHE
+    if isinstance(caches[alias], (LocMemCache, DummyCache)):
+        return [Error(
+            f'ACCESS_TOKEN_REVOCATION_CACHE {alias!r} is not shared by the '
+            'workers, so a revoked access token stays valid in the others '
+            'until it expires.',
+            hint='Point it at a cache shared by all workers, e.g. redis or '
+                 'memcached.',
+            id='user.E001',
+        )]
+    return []
@@ -2,7 +2,16 @@
 
 from django.contrib.auth import (get_user_model, authenticate)
 from django.utils.translation import gettext as _
-from rest_framework import serializers
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+
+class LoginBusy(APIException):
+    """every password hashing slot is taken"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'too many logins in progress, try again shortly'
+    default_code = 'login_busy'
+    wait = 1
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -42,14 +51,24 @@ class AuthTokenSerializer(serializers.Serializer):
         """validate and auth thye user"""
         email = attrs.get('email')
         password = attrs.get('password')
+        request = self.context.get('request')
         user = authenticate(
-            request=self.context.get('request'),
+            request=request,
             username = email,
             password=password,
         )
+        if getattr(request, 'login_busy', False):
+            raise LoginBusy()
         if not user:
             msg = _("unable to auth with provided details")
             raise serializers.ValidationError(msg, code="authorization")
 
         attrs['user'] = user
         return attrs
+
+
+class AccessTokenSerializer(serializers.Serializer):
+    """a signed access token and its lifetime in seconds"""
+
+    access = serializers.CharField(read_only=True)
+    expires_in = serializers.IntegerField(read_only=True)
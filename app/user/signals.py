@@ -0,0 +1,43 @@
+"""signal handlers keeping the token cache and access tokens fresh"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import token_cache
+from user.tokens import revoke_user_access_tokens
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def evict_token(sender, instance, **kwargs):
+    """drop a changed or deleted token"""
+    token_cache.evict(instance.key)
+
+
+@receiver(post_delete, sender=Token)
+def revoke_token_access(sender, instance, **kwargs):
+    """deleting the token that refreshes access tokens revokes them"""
+    revoke_user_access_tokens(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def evict_user_tokens(sender, instance, **kwargs):
+    """drop the tokens of a changed, deactivated or deleted user"""
+    token_cache.evict_user(instance.pk)
+
+
+@receiver(post_save, sender=get_user_model())
+def revoke_inactive_user_access(sender, instance, **kwargs):
+    """deactivated users lose their access tokens"""
+    if 'is_active' in instance.get_deferred_fields():
+        return
+    if not instance.is_active:
+        revoke_user_access_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def revoke_deleted_user_access(sender, instance, **kwargs):
+    """deleted users lose their access tokens"""
+    revoke_user_access_tokens(instance.pk)
@@ -0,0 +1,260 @@
+"""
+Tests for signed access tokens.
+"""
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.models import Recipe
+from user.authentication import SignedTokenAuthentication, token_cache
+from user.checks import check_revocation_cache
+from user.tokens import (
+    InvalidAccessToken,
+    issue_access_token,
+    read_access_token,
+    revoke_user_access_tokens,
+    verify_access_token,
+)
+
+TOKEN_URL = reverse('user:token')
+REFRESH_URL = reverse('user:token-refresh')
+REVOKE_URL = reverse('user:token-revoke')
+ME_URL = reverse('user:me')
+RECIPE_URL = reverse('recipe:recipe-list')
+KEYS = {'old': 'old secret', 'new': 'new secret'}
+
+
+class Holder:
+    """anything with a pk can be issued a token"""
+    pk = 7
+
+
+@override_settings(ACCESS_TOKEN_KEYS=KEYS, ACCESS_TOKEN_KEY_ID='new',
+                   ACCESS_TOKEN_TTL=300)
+class AccessTokenTests(SimpleTestCase):
+    """Test signing and reading access tokens."""
+
+    def test_round_trip(self):
+        """a token carries its user id and expiry"""
+        token, ttl = issue_access_token(Holder())
+
+        user_id, issued, expires = read_access_token(token)
+
+        self.assertTrue(token.startswith('new.7.'))
+        self.assertEqual(user_id, 7)
+        self.assertAlmostEqual(expires - issued, ttl)
+
+    def test_tampered(self):
+        """changing any part breaks the signature"""
+        token, _ = issue_access_token(Holder())
+        kid, user_id, rest = token.split('.', 2)
+
+        for forged in (f'{kid}.8.{rest}', token[:-2], 'x.y', ''):
+            with self.assertRaises(InvalidAccessToken):
+                read_access_token(forged)
+
+    def test_expired(self):
+        """tokens stop working after their ttl"""
+        token, _ = issue_access_token(Holder())
+        expires = read_access_token(token)[2]
+
+        with patch('user.tokens.time.time') as patched_time:
+            patched_time.return_value = expires
+            with self.assertRaises(InvalidAccessToken):
+                read_access_token(token)
+
+    def test_key_rotation(self):
+        """retired keys verify until removed"""
+        with self.settings(ACCESS_TOKEN_KEY_ID='old'):
+            token, _ = issue_access_token(Holder())
+
+        self.assertEqual(read_access_token(token)[0], 7)
+        with self.settings(ACCESS_TOKEN_KEYS={'new': KEYS['new']}):
+            with self.assertRaises(InvalidAccessToken):
+                read_access_token(token)
+
+
+class SignedTokenAuthenticationTests(TestCase):
+    """Test authenticating requests with access tokens."""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='access@example.com',
+            password='pass1234',
+            name='Access',
+        )
+        self.access, _ = issue_access_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_authenticate_without_queries(self):
+        """the user is loaded once per worker"""
+        request = APIRequestFactory().get(
+            RECIPE_URL, HTTP_AUTHORIZATION=f'Bearer {self.access}',
+        )
+        SignedTokenAuthentication().authenticate(request)
+
+        with self.assertNumQueries(0):
+            user, token = SignedTokenAuthentication().authenticate(request)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(token, self.access)
+        self.assertEqual(user.email, self.user.email)
+
+    def test_login_issues_access_token(self):
+        """logging in returns an access token next to the auth token"""
+        res = APIClient().post(
+            TOKEN_URL, {'email': 'access@example.com', 'password': 'pass1234'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', res.data)
+        self.assertEqual(verify_access_token(res.data['access']),
+                         self.user.pk)
+
+    def test_refresh(self):
+        """the auth token buys new access tokens, access tokens don't"""
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = client.post(REFRESH_URL)
+        refused = self.client.post(REFRESH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(verify_access_token(res.data['access']),
+                         self.user.pk)
+        self.assertEqual(refused.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_me(self):
+        """the profile is loaded once for access tokens"""
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'email': 'access@example.com',
+                                    'name': 'Access'})
+
+    def test_recipes(self):
+        """recipe views accept access tokens"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='pass1234',
+        )
+        Recipe.objects.create(user=other, title='Other', time_minitues=1,
+                              price='1.00')
+        payload = {'title': 'Mine', 'time_minitues': 5, 'price': '1.00',
+                   'description': 'hot'}
+
+        created = self.client.post(RECIPE_URL, payload)
+        listed = self.client.get(RECIPE_URL)
+
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [recipe['title'] for recipe in listed.data['results']], ['Mine'],
+        )
+        self.assertEqual(Recipe.objects.get(title='Mine').user, self.user)
+
+    def test_invalid_token(self):
+        """forged tokens are rejected with a bearer challenge"""
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}x')
+
+        res = self.client.post(REVOKE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Bearer')
+
+    def test_revoke(self):
+        """a revoked token is rejected, other tokens of the user aren't"""
+        earlier = time.time() - 1
+        with patch('user.tokens.time.time') as patched_time:
+            patched_time.return_value = earlier
+            other, _ = issue_access_token(self.user)
+
+        res = self.client.post(REVOKE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(verify_access_token(other), self.user.pk)
+
+    def test_revoked_with_auth_token(self):
+        """deleting the auth token revokes the user's access tokens"""
+        Token.objects.create(user=self.user).delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user(self):
+        """inactive users are rejected even when nothing was revoked"""
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=False,
+        )
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user(self):
+        """tokens of users that are gone are rejected"""
+        get_user_model().objects.filter(pk=self.user.pk).delete()
+        caches['default'].clear()
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_issued_after_revocation(self):
+        """tokens issued in the same second after a revocation work"""
+        now = time.time()
+        with patch('user.tokens.time.time') as patched_time:
+            patched_time.return_value = now
+            revoke_user_access_tokens(self.user.pk)
+            patched_time.return_value = now + 0.5
+            token, _ = issue_access_token(self.user)
+            issued_after = verify_access_token(token)
+            with self.assertRaises(InvalidAccessToken):
+                verify_access_token(self.access)
+
+        self.assertEqual(issued_after, self.user.pk)
+
+    def test_revoked_on_deactivation(self):
+        """deactivated users can't use their access tokens"""
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RevocationCacheCheckTests(SimpleTestCase):
+    """Test the deploy check of the revocation cache."""
+
+    def test_per_process_cache(self):
+        """a local memory cache is refused"""
+        errors = check_revocation_cache(None)
+
+        self.assertEqual([error.id for error in errors], ['user.E001'])
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/tmp/revocations',
+        },
+    })
+    def test_shared_cache(self):
+        """caches shared by the workers pass"""
+        self.assertEqual(check_revocation_cache(None), [])
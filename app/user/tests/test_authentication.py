@@ -0,0 +1,117 @@
+"""
+Tests for the cached token authentication.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import token_cache
+
+ME_URL = reverse('user:me')
+
+
+@override_settings(AUTH_TOKEN_CACHE_SIZE=100, AUTH_TOKEN_CACHE_TTL=30)
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating tokens through the cache."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = get_user_model().objects.create_user(
+            email='cached@example.com',
+            password='pass1234',
+            name='Cached',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = self.token_client(self.token)
+
+    def token_client(self, token):
+        """return a client sending the token"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def test_warm_worker_skips_database(self):
+        """a cached token is authenticated without any query"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_deleted_token_rejected(self):
+        """deleting a token evicts it"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """saving a user evicts their tokens"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_updated_user_served_fresh(self):
+        """changes made through the api are seen by the next request"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'Renamed'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Renamed')
+
+    def test_entries_expire(self):
+        """changes the signals miss are picked up after the ttl"""
+        self.client.get(ME_URL)
+        Token.objects.filter(key=self.token.key).delete()
+
+        with patch('user.authentication.time.monotonic') as monotonic:
+            monotonic.return_value = 10 ** 9
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_TOKEN_CACHE_SIZE=1)
+    def test_size_bounded(self):
+        """the least recently used token is dropped"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='pass1234',
+        )
+        self.client.get(ME_URL)
+        self.token_client(Token.objects.create(user=other)).get(ME_URL)
+
+        self.assertEqual(len(token_cache), 1)
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    @override_settings(AUTH_TOKEN_CACHE_TTL=0)
+    def test_disabled(self):
+        """a ttl of 0 turns the cache off"""
+        self.client.get(ME_URL)
+
+        self.assertEqual(len(token_cache), 0)
+
+    def test_requests_get_their_own_user(self):
+        """changes to request.user do not leak into the cache"""
+        res = self.client.get(ME_URL)
+        res.wsgi_request.user.name = 'changed in a view'
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Cached')
@@ -0,0 +1,102 @@
+"""benchmarks for logging in and authenticating requests
+
+Skipped by default, run with::
+
+    RUN_BENCHMARKS=1 python manage.py test user.tests.test_benchmarks
+"""
+import os
+import time
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from user.authentication import SignedTokenAuthentication
+from user.tokens import issue_access_token
+
+TOKEN_URL = reverse('user:token')
+HASHERS = {
+    'pbkdf2_sha256': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'user.hashers.ScryptPasswordHasher',
+}
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), 'set RUN_BENCHMARKS=1')
+class LoginBenchmark(TestCase):
+    """compare login throughput with pbkdf2 and scrypt"""
+
+    def logins_per_core_second(self, algorithm, count=20):
+        """log in repeatedly, return logins per second of cpu time"""
+        others = [path for name, path in HASHERS.items() if name != algorithm]
+        with override_settings(
+            PASSWORD_HASHERS=[HASHERS[algorithm], *others],
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                            'DEFAULT_THROTTLE_RATES': {}},
+        ):
+            get_user_model().objects.create(
+                email=f'{algorithm}@example.com',
+                password=make_password('pass1234', hasher=algorithm),
+            )
+            client = APIClient()
+            payload = {'email': f'{algorithm}@example.com',
+                       'password': 'pass1234'}
+            self.assertEqual(
+                client.post(TOKEN_URL, payload).status_code,
+                status.HTTP_200_OK,
+            )
+            started = time.process_time()
+            for _ in range(count):
+                client.post(TOKEN_URL, payload)
+            return count / (time.process_time() - started)
+
+    def test_login_throughput(self):
+        """scrypt logs in more users per core than pbkdf2"""
+        before = self.logins_per_core_second('pbkdf2_sha256')
+        after = self.logins_per_core_second('scrypt')
+
+        print(
+            f'\nlogins/s per core: pbkdf2 {before:.1f}, scrypt {after:.1f}'
+        )
+        self.assertGreater(after, before)
+
+
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), 'set RUN_BENCHMARKS=1')
+class AuthenticationBenchmark(TestCase):
+    """compare per request authentication with db and signed tokens"""
+
+    def microseconds_per_request(self, authenticator, header, count=2000):
+        """authenticate the same request repeatedly, return us per call"""
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=header)
+        authenticator.authenticate(request)
+        started = time.perf_counter()
+        for _ in range(count):
+            authenticator.authenticate(request)
+        return (time.perf_counter() - started) / count * 1e6
+
+    def test_authentication_overhead(self):
+        """signed access tokens authenticate faster than db tokens"""
+        user = get_user_model().objects.create_user(
+            email='bench@example.com', password='pass1234',
+        )
+        token = Token.objects.create(user=user)
+        access, _ = issue_access_token(user)
+
+        database = self.microseconds_per_request(
+            TokenAuthentication(), f'Token {token.key}',
+        )
+        signed = self.microseconds_per_request(
+            SignedTokenAuthentication(), f'Bearer {access}',
+        )
+
+        print(
+            f'\nauthentication us/request: token {database:.1f}, '
+            f'signed {signed:.1f}'
+        )
+        self.assertLess(signed, database)
@@ -0,0 +1,151 @@
+"""
+Tests for password hashing on login.
+"""
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import (
+    check_password,
+    identify_hasher,
+    make_password,
+)
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.hashers import ScryptPasswordHasher
+
+TOKEN_URL = reverse('user:token')
+SCRYPT_FIRST = [
+    'user.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+]
+
+
+class ScryptPasswordHasherTests(TestCase):
+    """Test the scrypt hasher."""
+
+    def test_round_trip(self):
+        """passwords verify against their own hash only"""
+        encoded = make_password('pass1234', hasher='scrypt')
+
+        self.assertTrue(encoded.startswith('scrypt$16384$'))
+        self.assertTrue(check_password('pass1234', encoded))
+        self.assertFalse(check_password('pass1235', encoded))
+
+    def test_must_update(self):
+        """a changed work factor asks for a rehash"""
+        hasher = ScryptPasswordHasher()
+        encoded = hasher.encode('pass1234', hasher.salt(), n=2 ** 10)
+
+        self.assertTrue(hasher.must_update(encoded))
+        self.assertFalse(hasher.must_update(hasher.encode('pass1234', 'a')))
+
+
+class LoginTests(TestCase):
+    """Test logging in through the hashing pool."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='login@example.com',
+            password='pass1234',
+        )
+        self.payload = {'email': 'login@example.com', 'password': 'pass1234'}
+
+    def test_login(self):
+        """the password is checked off the request thread"""
+        threads = []
+        original = check_password
+
+        def record(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return original(*args, **kwargs)
+
+        with patch('user.backends.check_password', record):
+            res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', res.data)
+        self.assertTrue(threads[0].startswith('login-hash'))
+
+    @override_settings(PASSWORD_HASHERS=SCRYPT_FIRST)
+    def test_rehash_on_login(self):
+        """old hashes are upgraded to the preferred hasher"""
+        self.user.password = make_password('pass1234', hasher='pbkdf2_sha256')
+        self.user.save()
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).algorithm,
+                         'scrypt')
+        self.assertTrue(self.user.check_password('pass1234'))
+
+    @override_settings(PASSWORD_HASHERS=SCRYPT_FIRST)
+    def test_no_rehash_on_failed_login(self):
+        """a wrong password leaves the stored hash alone"""
+        encoded = make_password('pass1234', hasher='pbkdf2_sha256')
+        self.user.password = encoded
+        self.user.save()
+
+        res = self.client.post(
+            TOKEN_URL, {**self.payload, 'password': 'wrong'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, encoded)
+
+    def test_unknown_user(self):
+        """unknown emails are hashed too and rejected"""
+        with patch('user.backends.make_password') as patched_make:
+            res = self.client.post(
+                TOKEN_URL, {**self.payload, 'email': 'nobody@example.com'},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        patched_make.assert_called_once_with('pass1234')
+
+    def test_saturated_pool_refuses(self):
+        """logins beyond the queue bound get 503 with retry-after"""
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+
+        with patch('user.backends.get_executor') as patched_executor:
+            patched_executor.return_value = (None, slots)
+            res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+
+    def test_saturated_pool_admin_login(self):
+        """the admin login fails like a wrong password instead of a 500"""
+        self.user.is_staff = True
+        self.user.save()
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+
+        with patch('user.backends.get_executor') as patched_executor:
+            patched_executor.return_value = (None, slots)
+            res = Client().post(reverse('admin:login'), {
+                'username': self.payload['email'],
+                'password': self.payload['password'],
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.context['user'].is_authenticated)
+
+    @override_settings(LOGIN_HASH_WORKERS=0)
+    @patch('user.backends.get_executor')
+    def test_inline_without_workers(self, patched_executor):
+        """with no workers the hash runs on the request thread"""
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        patched_executor.assert_not_called()
@@ -0,0 +1,119 @@
+"""short lived signed access tokens
+
+An access token is ``<kid>.<user id>.<issued at>.<expires at>.<signature>``
+with both times in milliseconds, where the signature is an HMAC-SHA256 of
+the rest under the key ACCESS_TOKEN_KEYS[kid]. Verifying one needs no
+database: the user id and expiry are in the token itself.
+
+New tokens are signed with ACCESS_TOKEN_KEY_ID. To rotate, add a new key,
+make it current and remove the old one once ACCESS_TOKEN_TTL has passed.
+
+Tokens can't be recalled once issued, so a small revocation list in the
+ACCESS_TOKEN_REVOCATION_CACHE holds single revoked tokens and, per user, a
+time before which all of their tokens are rejected, each only until the
+tokens involved would have expired anyway. check --deploy requires it
+to be a cache shared by all workers.
+"""
+import base64
+import hashlib
+import hmac
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.encoding import force_bytes
+
+REVOKED_TOKEN = 'access-revoked:token:%s'
+REVOKED_USER = 'access-revoked:user:%s'
+
+
+class InvalidAccessToken(Exception):
+    """the token is malformed, forged, expired or revoked"""
+
+
+def _signing_key(kid):
+    """the hmac key for a key id, None for unknown ids"""
+    secret = settings.ACCESS_TOKEN_KEYS.get(kid)
+    if secret is None:
+        return None
+    return hashlib.sha256(b'user.tokens' + force_bytes(secret)).digest()
+
+
+def _signature(key, message):
+    digest = hmac.new(key, message.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def _revocations():
+    return caches[settings.ACCESS_TOKEN_REVOCATION_CACHE]
+
+
+def issue_access_token(user):
+    """return a new access token for user and its lifetime in seconds"""
+    kid = settings.ACCESS_TOKEN_KEY_ID
+    ttl = settings.ACCESS_TOKEN_TTL
+    issued = int(time.time() * 1000)
+    message = f'{kid}.{user.pk}.{issued}.{issued + ttl * 1000}'
+    return f'{message}.{_signature(_signing_key(kid), message)}', ttl
+
+
+def _token_id(token):
+    """the part of a token identifying it in the revocation list"""
+    return token.rsplit('.', 1)[-1]
+
+
+def read_access_token(token):
+    """(user id, issued at, expires at) of a genuine unexpired token
+
+    The times are in seconds. Only checks the signature and expiry, see
+    verify_access_token. Raises InvalidAccessToken for anything else.
+    """
+    try:
+        message, signature = token.rsplit('.', 1)
+        kid, user_id, issued, expires = message.split('.')
+        user_id, issued, expires = int(user_id), int(issued), int(expires)
+    except ValueError:
+        raise InvalidAccessToken('malformed token')
+    key = _signing_key(kid)
+    if key is None:
+        raise InvalidAccessToken('unknown signing key')
+    if not hmac.compare_digest(_signature(key, message), signature):
+        raise InvalidAccessToken('bad signature')
+    issued, expires = issued / 1000, expires / 1000
+    if expires <= time.time():
+        raise InvalidAccessToken('token expired')
+    return user_id, issued, expires
+
+
+def verify_access_token(token):
+    """user id of a valid token that was not revoked"""
+    user_id, issued, _ = read_access_token(token)
+    token_key = REVOKED_TOKEN % _token_id(token)
+    user_key = REVOKED_USER % user_id
+    revoked = _revocations().get_many([token_key, user_key])
+    if token_key in revoked or issued <= revoked.get(user_key, -1):
+        raise InvalidAccessToken('token revoked')
+    return user_id
+
+
+def revoke_access_token(token):
+    """reject a token from now until it expires"""
+    _, _, expires = read_access_token(token)
+    _revocations().set(
+        REVOKED_TOKEN % _token_id(token),
+        True,
+        timeout=int(expires - time.time()) + 1,
+    )
+
+
+def revoke_user_access_tokens(user_id):
+    """reject every token issued to a user up to now
+
+    The cutoff keeps its fraction of a second, tokens issued right after
+    a revocation, e.g. on the next login, are accepted.
+    """
+    _revocations().set(
+        REVOKED_USER % user_id,
+        time.time(),
+        timeout=settings.ACCESS_TOKEN_TTL + 1,
+    )
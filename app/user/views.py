@@ -1,27 +1,101 @@
 """views for the user API"""
 
-from rest_framework import generics, authentication, permissions
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, permissions, status
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
-from user.serializers import (UserSerializer, AuthTokenSerializer)
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from core.throttling import (
+    LoginAccountThrottle,
+    LoginIPThrottle,
+    SignupIPThrottle,
+    ThrottleFirstMixin,
+)
+from user.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+from user.serializers import (
+    AccessTokenSerializer,
+    AuthTokenSerializer,
+    UserSerializer,
+)
+from user.tokens import issue_access_token, revoke_access_token
 from rest_framework.settings import api_settings
 
-class CreateUserView(generics.CreateAPIView):
+
+class CreateUserView(ThrottleFirstMixin, generics.CreateAPIView):
     """create a new user in the system"""
 
     serializer_class = UserSerializer
 
-class CreateTokenView(ObtainAuthToken):
+    throttle_classes = [SignupIPThrottle]
+
+
+class CreateTokenView(ThrottleFirstMixin, ObtainAuthToken):
     """create a new auth token for user"""
 
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
+
+    def post(self, request, *args, **kwargs):
+        """return the auth token and a first access token"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        access, expires_in = issue_access_token(user)
+        return Response({
+            'token': token.key,
+            'access': access,
+            'expires_in': expires_in,
+        })
+
+
+class RefreshAccessTokenView(generics.GenericAPIView):
+    """exchange the auth token for a new access token"""
+
+    serializer_class = AccessTokenSerializer
+
+    authentication_classes = [CachedTokenAuthentication]
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(request=None)
+    def post(self, request):
+        access, expires_in = issue_access_token(request.user)
+        serializer = self.get_serializer(
+            {'access': access, 'expires_in': expires_in}
+        )
+        return Response(serializer.data)
+
+
+class RevokeAccessTokenView(APIView):
+    """revoke the access token of the request"""
+
+    authentication_classes = [SignedTokenAuthentication]
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(request=None, responses={204: None})
+    def post(self, request):
+        revoke_access_token(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """manage authenticated user"""
 
     serializer_class = UserSerializer
 
-    authentication_classes = [authentication.TokenAuthentication]
+    read_replica = True
+
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
 
     permission_classes = [permissions.IsAuthenticated]
 